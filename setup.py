@@ -12,6 +12,7 @@ setup(
     download_url="https://github.com/pyreiz/app-stg4000.git",
     license="MIT",
     packages=["stg", "stg._wrapper", "stg.example"],
+    install_requires=["numpy"],
     entry_points={"console_scripts": ["stg4000-pulsegui=stg.gui.main:main"],},
     classifiers=[
         "Development Status :: 4 - Beta",
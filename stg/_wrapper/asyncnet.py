@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from functools import partial
+from pathlib import Path
+from typing import List, Tuple, Callable, Any, Union, Optional, Set
+from stg._wrapper.dll import OptionalInt
+from stg._wrapper.streamingnet import STG4000Streamer
+
+
+class AsyncSTG4000:
+    """
+    An asyncio interface to download, start and stop stimulation and to control streaming
+
+    Every call into the STG blocks for at least one USB round-trip. To keep these calls out of your event loop, all device I/O is run on a single dedicated thread. Commands are executed in the order they were awaited or scheduled, e.g. with :code:`asyncio.create_task`. Cancelling a command which was not yet started removes it from the queue. A command which is already running can not be interrupted, but its result is discarded.
+
+    The state of the streaming thread can be awaited, too, see :meth:`~.wait_started`, :meth:`~.wait_stopped` and :meth:`~.wait_buffer_level`.
+
+    Example
+    -------
+
+    .. code-block:: python
+
+        import asyncio
+        from stg.api import AsyncSTG4000
+
+        async def main():
+            async with await AsyncSTG4000.open() as stg:
+                await stg.download(0, [1, -1, 0], [0.1, 0.1, 49.8])
+                await stg.start_stimulation([0])
+
+        asyncio.run(main())
+
+    args
+    ----
+    stg: STG4000Streamer
+        the STG to control. Use :meth:`~.open` to initialize it without blocking the event loop
+    """
+
+    def __init__(self, stg: STG4000Streamer):
+        self.stg = stg
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="AsyncSTG4000"
+        )
+        self._waiters: List[Tuple[Callable[[], bool], asyncio.Future]] = []
+        self._pending: Set[Future] = set()
+        self._lock = threading.Lock()
+        stg.subscribe(self._check)
+
+    @classmethod
+    async def open(
+        cls,
+        serial: OptionalInt = None,
+        persistent: bool = True,
+        property_cache: Union[bool, str, Path] = False,
+    ) -> "AsyncSTG4000":
+        """connect with an STG without blocking the event loop
+
+        By default, the connection is kept open until :meth:`~.close` or :meth:`~.start_streaming`, see :meth:`~.STGX.open_session`.
+        """
+        loop = asyncio.get_running_loop()
+        stg = await loop.run_in_executor(
+            None, partial(STG4000Streamer, serial, persistent, property_cache)
+        )
+        return cls(stg)
+
+    def _submit(self, fn: Callable, *args, **kwargs) -> "asyncio.Future[Any]":
+        future = self._executor.submit(fn, *args, **kwargs)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return asyncio.wrap_future(future)
+
+    async def close(self):
+        "stop streaming, close the connection, and cancel all commands not yet started"
+        self.stg.unsubscribe(self._check)
+        try:
+            await self._submit(self.stg.stop_streaming)
+            await self._submit(self.stg.close_session)
+        finally:
+            # shutdown(cancel_futures=True) requires Python 3.9
+            for future in self._pending.copy():
+                future.cancel()
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._executor.shutdown
+            )
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, tb):
+        await self.close()
+
+    # commands --------------------------------------------------------------
+    async def download(
+        self,
+        channel_index: int = 0,
+        amplitudes_in_mA: List[float] = [0],
+        durations_in_ms: List[float] = [0],
+        mode: str = "current",
+    ):
+        "see :meth:`~.STG4000.download`"
+        return await self._submit(
+            self.stg.download, channel_index, amplitudes_in_mA, durations_in_ms, mode
+        )
+
+    async def download_native(
+        self, channel_index: int, amplitudes_in_nA, durations_in_us, mode="current"
+    ):
+        "see :meth:`~.STG4000.download_native`"
+        return await self._submit(
+            self.stg.download_native,
+            channel_index,
+            amplitudes_in_nA,
+            durations_in_us,
+            mode,
+        )
+
+    async def start_stimulation(self, triggerIndex: List[int] = []):
+        "see :meth:`~.STG4000.start_stimulation`"
+        return await self._submit(self.stg.start_stimulation, triggerIndex)
+
+    async def stop_stimulation(self, triggerIndex: List[int] = []):
+        "see :meth:`~.STG4000.stop_stimulation`"
+        return await self._submit(self.stg.stop_stimulation, triggerIndex)
+
+    async def set_mode(self, channel_index: List[int] = [], mode: str = "current"):
+        "see :meth:`~.STG4000.set_mode`"
+        return await self._submit(self.stg.set_mode, channel_index, mode)
+
+    async def diagonalize_triggermap(self):
+        "see :meth:`~.STG4000.diagonalize_triggermap`"
+        return await self._submit(self.stg.diagonalize_triggermap)
+
+    async def set_signal(
+        self,
+        channel_index: int = 0,
+        amplitudes_in_mA: List[float] = [0],
+        durations_in_ms: List[float] = [0],
+        switch_at_sample: Optional[int] = None,
+    ):
+        "see :meth:`~.STG4000Streamer.set_signal`"
+        return await self._submit(
+            self.stg.set_signal,
+            channel_index,
+            amplitudes_in_mA,
+            durations_in_ms,
+            switch_at_sample,
+        )
+
+    async def start_streaming(
+        self,
+        capacity_in_s: float = 1,
+        buffer_in_s: float = 0.1,
+        callback_percent: int = 10,
+    ):
+        "see :meth:`~.STG4000Streamer.start_streaming`"
+        return await self._submit(
+            self.stg.start_streaming, capacity_in_s, buffer_in_s, callback_percent
+        )
+
+    async def stop_streaming(self):
+        "see :meth:`~.STG4000Streamer.stop_streaming`"
+        return await self._submit(self.stg.stop_streaming)
+
+    # streaming state -------------------------------------------------------
+    def _check(self):
+        "called by the streaming thread whenever its state changed"
+        if not self._waiters:
+            return
+        with self._lock:
+            for predicate, future in tuple(self._waiters):
+                if predicate():
+                    self._waiters.remove((predicate, future))
+                    future.get_loop().call_soon_threadsafe(_resolve, future)
+
+    async def _wait_for(self, predicate: Callable[[], bool]):
+        future = asyncio.get_running_loop().create_future()
+        with self._lock:
+            if predicate():
+                return
+            self._waiters.append((predicate, future))
+        try:
+            await future
+        finally:
+            with self._lock:
+                if (predicate, future) in self._waiters:
+                    self._waiters.remove((predicate, future))
+
+    async def wait_started(self):
+        "wait until the streaming thread pushes data into the DLL"
+        await self._wait_for(lambda: self.stg.started)
+
+    async def wait_stopped(self):
+        "wait until the streaming thread stopped"
+        await self._wait_for(lambda: not self.stg.started)
+
+    async def wait_buffer_level(
+        self,
+        channel_index: int = 0,
+        below: Optional[int] = None,
+        above: Optional[int] = None,
+    ) -> int:
+        """wait until the number of samples queued for a channel in the DLL buffer is below and/or above a threshold
+
+        Returns the level which satisfied the condition, see :meth:`~.STG4000Streamer.buffer_level`
+        """
+        if below is None and above is None:
+            raise ValueError("Specify a threshold with below or above")
+
+        def predicate() -> bool:
+            level = self.stg.buffer_level(channel_index)
+            return (below is None or level < below) and (
+                above is None or level > above
+            )
+
+        await self._wait_for(predicate)
+        return self.stg.buffer_level(channel_index)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
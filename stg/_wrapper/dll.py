@@ -1,68 +1,192 @@
 from pathlib import Path
+import json
+import os
+import tempfile
 from sys import platform
-from typing import List, Union, Any, Callable
+from typing import List, Union, Any, Callable, Optional, Dict, Tuple
+from functools import lru_cache
+from types import SimpleNamespace
+from time import monotonic
+import threading
+from contextlib import contextmanager
 from time import sleep
 from abc import ABC, abstractmethod
+from stg._wrapper.latency import LatencyRecorder
 
 OptionalInt = Union[int, None]
+# the DeviceInfo below is a proxy loading the backend, and can not be used for annotations
+DeviceInfoType = Any
 
 # ----------------------------------------------------------------------------
-# Mocking everything in case we run this for testing or on Linux
-if "win" in platform:  # pragma no cover
-    # pylint: disable=import-error
-    import clr
-    import System
-    from stg.install import DLLPATH
-
-    lib = System.Reflection.Assembly.LoadFile(str(DLLPATH))
-    from Mcs.Usb import (
-        CMcsUsbListNet,
-        DeviceEnumNet,
-        CStg200xStreamingNet,
-        CStg200xDownloadNet,
-        STG_DestinationEnumNet,
-    )
-
-    CURRENT = STG_DestinationEnumNet.channeldata_current
-    VOLTAGE = STG_DestinationEnumNet.channeldata_voltage
-    from Mcs.Usb import CMcsUsbListEntryNet as DeviceInfo
-else:  # pragma no cover
-    from stg._wrapper.mock import (
-        CMcsUsbListNet,
-        DeviceEnumNet,
-        CStg200xStreamingNet,
-        CStg200xDownloadNet,
-        CURRENT,
-        VOLTAGE,
-        DeviceInfo,
-        System,
-    )
-from stg._wrapper.mock import CStg200xMockNet
-from stg._wrapper.mock import info as mockinfo
+# The backend is either the DLL, or a mock in case we run this for testing or
+# on Linux. It is loaded lazily, i.e. importing the package neither loads the
+# .NET assembly nor unittest.mock.
+@lru_cache(maxsize=None)
+def backend() -> SimpleNamespace:
+    """select and load the backend on first device use
+
+    This is the single point where we decide between the DLL and the mock. On Windows, the .NET assembly is loaded via pythonnet, everywhere else the mock from :mod:`stg._wrapper.mock` is used. The result is cached, so the cost is only paid once per process, and not at all if no device is ever used.
+    """
+    if "win" in platform:  # pragma no cover
+        # pylint: disable=import-error
+        import clr
+        import System
+        from stg.install import DLLPATH
+
+        System.Reflection.Assembly.LoadFile(str(DLLPATH))
+        from Mcs.Usb import (
+            CMcsUsbListNet,
+            DeviceEnumNet,
+            CStg200xStreamingNet,
+            CStg200xDownloadNet,
+            STG_DestinationEnumNet,
+        )
+        from Mcs.Usb import CMcsUsbListEntryNet as DeviceInfo
+
+        return SimpleNamespace(
+            CMcsUsbListNet=CMcsUsbListNet,
+            DeviceEnumNet=DeviceEnumNet,
+            CStg200xStreamingNet=CStg200xStreamingNet,
+            CStg200xDownloadNet=CStg200xDownloadNet,
+            CURRENT=STG_DestinationEnumNet.channeldata_current,
+            VOLTAGE=STG_DestinationEnumNet.channeldata_voltage,
+            DeviceInfo=DeviceInfo,
+            System=System,
+        )
+    else:  # pragma no cover
+        from stg._wrapper import mock
+
+        return SimpleNamespace(
+            CMcsUsbListNet=mock.CMcsUsbListNet,
+            DeviceEnumNet=mock.DeviceEnumNet,
+            CStg200xStreamingNet=mock.CStg200xStreamingNet,
+            CStg200xDownloadNet=mock.CStg200xDownloadNet,
+            CURRENT=mock.CURRENT,
+            VOLTAGE=mock.VOLTAGE,
+            DeviceInfo=mock.DeviceInfo,
+            System=mock.System,
+        )
+
+
+class _Lazy:
+    "stands in for a class or namespace of the backend, and loads it when it is used"
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, item):
+        if item.startswith("__"):  # e.g. typing probing annotations
+            raise AttributeError(item)
+        return getattr(getattr(backend(), self._name), item)
+
+    def __getitem__(self, key):
+        return getattr(backend(), self._name)[key]
+
+    def __call__(self, *args, **kwargs):
+        return getattr(backend(), self._name)(*args, **kwargs)
+
+    def __repr__(self) -> str:
+        return f"<lazy {self._name} of the STG backend>"
+
+
+CMcsUsbListNet = _Lazy("CMcsUsbListNet")
+DeviceEnumNet = _Lazy("DeviceEnumNet")
+CStg200xStreamingNet = _Lazy("CStg200xStreamingNet")
+CStg200xDownloadNet = _Lazy("CStg200xDownloadNet")
+DeviceInfo = _Lazy("DeviceInfo")
+System = _Lazy("System")
+
+
+def __getattr__(name: str):
+    # CURRENT and VOLTAGE are passed on to the DLL, and can not be proxies
+    if name in ("CURRENT", "VOLTAGE"):
+        return getattr(backend(), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 # ------------------------------------------------------------------------------
-def available() -> List[DeviceInfo]:
-    "list all available MCS STGs connected over USB with this PC"
-    deviceList = CMcsUsbListNet()
-    deviceList.Initialize(DeviceEnumNet.MCS_STG_DEVICE)
-    devices = []
-    for dev_num in range(0, deviceList.GetNumberOfDevices()):
-        devices.append(deviceList.GetUsbListEntry(dev_num))
-    return devices
-
-
-def select(serialnumber: OptionalInt = None) -> Union[DeviceInfo, None]:
-    "select an STG with a specific serial number from all connected devices"
-    if serialnumber == -1:
-        return mockinfo
+class _DeviceCache:
+    """Remembers the enumerated STGs for a short time and indexes them by serial number
 
-    deviceList = CMcsUsbListNet()
-    deviceList.Initialize(DeviceEnumNet.MCS_STG_DEVICE)
-    for dev_num in range(0, deviceList.GetNumberOfDevices()):
-        snum = int(deviceList.GetUsbListEntry(dev_num).SerialNumber)
-        if snum == serialnumber:
+    Enumerating the USB bus is slow, so the devices are only enumerated again if the last enumeration is older than :attr:`ttl_in_s`, if a serial number is unknown or if a refresh is requested explicitly.
+    """
+
+    ttl_in_s: float = 2.0  #: for how long the enumerated devices are reused
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._devices: List[DeviceInfoType] = []
+        self._by_serial: Dict[int, DeviceInfoType] = {}
+        self._complete = False
+        self._time = float("-inf")
+
+    def _scan(self, serialnumber: OptionalInt = None):
+        "enumerate all devices, or stop as soon as the given serial number was found"
+        deviceList = CMcsUsbListNet()
+        deviceList.Initialize(DeviceEnumNet.MCS_STG_DEVICE)
+        self._devices, self._by_serial, self._complete = [], {}, False
+        self._time = monotonic()
+        for dev_num in range(0, deviceList.GetNumberOfDevices()):
             device = deviceList.GetUsbListEntry(dev_num)
-    return device
+            snum = int(device.SerialNumber)
+            self._devices.append(device)
+            self._by_serial[snum] = device
+            if snum == serialnumber:
+                return
+        self._complete = True
+
+    def _stale(self) -> bool:
+        return monotonic() - self._time > self.ttl_in_s
+
+    def devices(self, refresh: bool = False) -> List[DeviceInfoType]:
+        with self._lock:
+            if refresh or self._stale() or not self._complete:
+                self._scan()
+            return list(self._devices)
+
+    def lookup(self, serialnumber: int, refresh: bool = False) -> DeviceInfoType:
+        with self._lock:
+            if refresh or self._stale() or serialnumber not in self._by_serial:
+                self._scan(serialnumber)
+            try:
+                return self._by_serial[serialnumber]
+            except KeyError:
+                raise ConnectionError(
+                    f"No STG with serial number {serialnumber} connected, or connected but not switched on."
+                )
+
+    def clear(self):
+        with self._lock:
+            self._devices, self._by_serial, self._complete = [], {}, False
+            self._time = float("-inf")
+
+
+_device_cache = _DeviceCache()
+
+
+def available(refresh: bool = False) -> List[DeviceInfoType]:
+    """list all available MCS STGs connected over USB with this PC
+
+    The result of the last enumeration is reused for a few seconds. Set :code:`refresh=True` to enforce a new enumeration, e.g. after plugging in an STG.
+    """
+    return _device_cache.devices(refresh)
+
+
+def select(serialnumber: OptionalInt = None, refresh: bool = False) -> DeviceInfoType:
+    """select an STG with a specific serial number from all connected devices
+
+    Devices are looked up by serial number in the cache of :func:`~.available`. The USB bus is only enumerated if the cache is outdated, the serial number is unknown, or :code:`refresh=True`, and then only until the device is found. Without a serial number, the first available STG is selected. Raises a ConnectionError if no such STG is connected.
+    """
+    if serialnumber is None:
+        try:
+            return available(refresh)[0]
+        except IndexError:
+            raise ConnectionError("No STG connected, or connected but not switched on.")
+    if serialnumber == -1:
+        from stg._wrapper.mock import info as mockinfo
+
+        return mockinfo
+    return _device_cache.lookup(serialnumber, refresh)
 
 
 def bitmap(valuelist: list):
@@ -70,6 +194,82 @@ def bitmap(valuelist: list):
     return None if bmap == 0 else bmap
 
 
+PROPERTY_CACHE = Path("~/.cache/stg/properties.json")  #: default location
+
+
+def _property_cache_path(property_cache: Union[bool, str, Path]) -> Optional[Path]:
+    if property_cache is True:
+        return PROPERTY_CACHE.expanduser()
+    if not property_cache:
+        return None
+    return Path(str(property_cache)).expanduser()
+
+
+# the properties of an STG, which are read once and can be cached
+_PROPERTY_KEYS = (
+    "current_resolution_in_nA",
+    "current_range_in_nA",
+    "voltage_resolution_in_uV",
+    "voltage_range_in_uV",
+    "dac_resolution",
+    "analog_channels",
+    "trigger_inputs",
+)
+
+
+def _load_property_cache(cache: Path) -> dict:
+    "the content of the cache, or an empty dict if it is missing or not a dict"
+    try:
+        content = json.loads(cache.read_text())
+    except (OSError, ValueError):
+        return {}
+    return content if isinstance(content, dict) else {}
+
+
+def _read_property_cache(cache: Optional[Path], serial: int, version) -> Optional[dict]:
+    "the cached properties of the STG, or None if they are missing, outdated or malformed"
+    if cache is None:
+        return None
+    entry = _load_property_cache(cache).get(str(serial))
+    if not isinstance(entry, dict):
+        return None
+    if entry.get("version") != [str(v) for v in version]:
+        return None
+    props = entry.get("properties")
+    if not isinstance(props, dict):
+        return None
+    for key in _PROPERTY_KEYS:
+        value = props.get(key)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+    return props
+
+
+def _write_property_cache(cache: Optional[Path], serial: int, version, props: dict):
+    "store the properties of the STG, silently giving up if the cache is not writable"
+    if cache is None:
+        return
+    content = _load_property_cache(cache)
+    content[str(serial)] = {
+        "version": [str(v) for v in version],
+        "properties": {
+            key: value if isinstance(value, int) else float(value)
+            for key, value in props.items()
+        },
+    }
+    tmp = None
+    try:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        # unique, because several devices can be opened concurrently, e.g. by a DeviceGroup
+        fd, tmp = tempfile.mkstemp(prefix=cache.name, suffix=".tmp", dir=cache.parent)
+        with os.fdopen(fd, "w") as f:
+            f.write(json.dumps(content, indent=2))
+        os.replace(tmp, cache)  # atomic, concurrent readers never see a partial file
+    except OSError:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+
+
 # ------------------------------------------------------------------------------
 class BasicInterface(ABC):
     """Implements the `with` syntax for connecting to a CStg200xDownloadNet or CStg200xStreamingNet
@@ -94,19 +294,36 @@ class BasicInterface(ABC):
     
     """
 
+    connected = False
+    #: if set, the latency of every call to the DLL is recorded, see :func:`~.start_instrumentation`
+    recorder: Optional[LatencyRecorder] = None
+    #: methods of the DLL which are resolved once per connection, see :meth:`~.bind`
+    hot_methods: Tuple[str, ...] = ()
+
     @abstractmethod
-    def __init__(self, info: DeviceInfo, *args, **kwargs):  # pragma no cover
+    def __init__(self, info: DeviceInfoType, *args, **kwargs):  # pragma no cover
         pass
 
     def connect(self) -> int:
-        "connect with the device"
-        self.connected = True
-        return self._interface.Connect(self._info)
+        "connect with the device, and mark the interface as connected if that succeeded"
+        err = self.Connect(self._info)
+        if err == 0:
+            self.connected = True
+            self.bind()
+        return err
+
+    def bind(self):
+        """resolve the :attr:`~.hot_methods` once and cache them as attributes of the interface
+
+        Afterwards, calling them no longer passes through :meth:`~.__getattr__`, which saves a dynamic lookup on the .NET object for every call. This is called whenever a connection is established. Whether a call is timed is decided when it is made, so :func:`~.start_instrumentation` and :func:`~.stop_instrumentation` also apply to connections which are already open.
+        """
+        for name in self.hot_methods:
+            self.__dict__[name] = _hot(name, getattr(self._interface, name))
 
     def disconnect(self):
         "disconnect from the device"
         self.connected = False
-        self._interface.Disconnect()
+        self.Disconnect()
 
     def __enter__(self):
         err = self.connect()
@@ -119,28 +336,136 @@ class BasicInterface(ABC):
         self.disconnect()
 
     def __getattr__(self, item):
-        return getattr(self._interface, item)
+        if item.startswith("_"):  # e.g. _interface before initialization
+            raise AttributeError(item)
+        attr = getattr(self._interface, item)
+        recorder = BasicInterface.recorder
+        if recorder is not None and callable(attr):
+            return recorder.wrap(item, attr)
+        return attr
+
+
+def _hot(name: str, method: Callable) -> Callable:
+    "a resolved method of the DLL, timed while instrumentation is active"
+
+    def call(*args, **kwargs):
+        recorder = BasicInterface.recorder
+        if recorder is None:
+            return method(*args, **kwargs)
+        return recorder.wrap(name, method)(*args, **kwargs)
+
+    call.__wrapped__ = method  # type: ignore
+    return call
+
+
+def start_instrumentation(recorder: Optional[LatencyRecorder] = None) -> LatencyRecorder:
+    """record the latency of all calls to the DLL from now on
+
+    args
+    ----
+    recorder: Optional[LatencyRecorder]
+        continue recording with this recorder, defaults to a new one
+
+    returns
+    -------
+    recorder: LatencyRecorder
+        the recorder, use its :meth:`~.LatencyRecorder.summary` or :meth:`~.LatencyRecorder.dump` to export the latencies
+    """
+    BasicInterface.recorder = recorder if recorder is not None else LatencyRecorder()
+    return BasicInterface.recorder
+
+
+def stop_instrumentation() -> Optional[LatencyRecorder]:
+    "stop recording the latency of calls to the DLL, and return the last recorder"
+    recorder, BasicInterface.recorder = BasicInterface.recorder, None
+    return recorder
+
+
+_DOWNLOAD_METHODS = (
+    "SendStart",
+    "SendStop",
+    "PrepareAndSendData",
+    "SetCurrentMode",
+    "SetVoltageMode",
+    "SetupTrigger",
+)
+_STREAMING_METHODS = ("GetDataQueueSpace", "EnqueueData", "SendStart", "SendStop")
 
 
 class MockingInterface(BasicInterface):
-    def __init__(self, info: DeviceInfo, *args, **kwargs):
+    hot_methods = tuple(sorted(set(_DOWNLOAD_METHODS + _STREAMING_METHODS)))
+
+    def __init__(self, info: DeviceInfoType, *args, **kwargs):
         self.connected = False
+        from stg._wrapper.mock import CStg200xMockNet
+
         self._info = info
         self._interface = CStg200xMockNet(*args, **kwargs)
 
 
 class DownloadInterface(BasicInterface):
-    def __init__(self, info: DeviceInfo):
+    hot_methods = _DOWNLOAD_METHODS
+
+    def __init__(self, info: DeviceInfoType):
         self._info = info
         self._interface = CStg200xDownloadNet()
 
 
 class StreamingInterface(BasicInterface):
-    def __init__(self, info: DeviceInfo, buffer_size: int = 50_000):
+    hot_methods = _STREAMING_METHODS
+
+    def __init__(self, info: DeviceInfoType, buffer_size: int = 50_000):
         self._info = info
         self._interface = CStg200xStreamingNet(System.UInt32(buffer_size))
 
 
+class Session:
+    """Keeps a single connection open across many `with` blocks
+
+    .. code-block:: python
+
+       session = Session(DownloadInterface(info))
+       with session as interface:  # connects
+           interface.SendStart(1)
+       with session as interface:  # reuses the connection
+           interface.SendStop(1)
+       session.close()  # disconnects
+
+    If an exception is raised within a `with` block, the connection is dropped, because it might be broken, and reestablished when the session is entered the next time.
+    """
+
+    def __init__(self, interface: BasicInterface):
+        self._interface = interface
+
+    @property
+    def connected(self) -> bool:
+        "whether the connection is currently open"
+        return self._interface.connected
+
+    def open(self):
+        "connect with the device, unless the connection is already open"
+        if not self._interface.connected:
+            err = self._interface.connect()
+            if err != 0:  # pragma no cover
+                raise ConnectionRefusedError(f"{err}")
+
+    def close(self):
+        "disconnect from the device"
+        if self._interface.connected:
+            self._interface.disconnect()
+
+    def __enter__(self) -> BasicInterface:
+        self.open()
+        return self._interface
+
+    def __exit__(self, type, value, tb):
+        if type is not None:
+            try:
+                self.close()
+            except Exception:  # pragma no cover
+                self._interface.connected = False
+
+
 class STGX(ABC):
     """
     The STGX is the base class for the STG4000 and wraps the basic USB interface and reads all the properties that are determined by the specific STG connected to your PC. Additionally methods for downloading or streaming are implemented by subclasses. Ideally, just use :code:`from stg.api import STG4000`, and you will get the class implementing all bells and whistles.
@@ -151,60 +476,74 @@ class STGX(ABC):
 
     Because at any time, only one process can be connected with a specific STG the connection is implemented using a :code:`with ... as` idiom. This should therefore be relatively safe. It is still possible that the STG can get into a weird state. In that case, try turning it off and on again.
 
+    Connecting and disconnecting for every call costs time. If your process is the only one talking to the STG, you can keep the connection open with :meth:`~.open_session` (or initialize with :code:`persistent=True`) until you call :meth:`~.close_session`. Within :code:`with stg.session():` the connection is closed automatically at the end of the block. If a call fails, the connection is reestablished with the next call.
+
+    The read-only properties can additionally be stored on disk by initializing with :code:`property_cache=True` (or the path of a json file, the default is :code:`~/.cache/stg/properties.json`). They are stored per serial number, and reused as long as the soft- and hardware version reported by the STG are unchanged. Reading this version is then the only call needed during initialization.
+
     .. note::
 
         * Properties are eagerly loaded and cached during initalization
+        * Persistent sessions are opt-in, and have to be closed explicitly
     """
 
-    def __init__(self, serial: OptionalInt = None):
-        if serial is None:
-            try:
-                info = available()[0]
-            except IndexError as e:  # pragma no cover
-                raise ConnectionError(
-                    "No STG connected, or connected but not switched on."
-                )
-        else:  # pragma no cover
-            info = select(serial)
+    _session: Optional[Session] = None
+
+    def __init__(
+        self,
+        serial: OptionalInt = None,
+        persistent: bool = False,
+        property_cache: Union[bool, str, Path] = False,
+    ):
+        info = select(serial)
         print(
             "Selecting {0:s}:SN {1:s}".format(
                 info.DeviceName, info.SerialNumber
             )
         )
         self._info = info
-        self._collect_properties()
+        if persistent:
+            self.open_session()
+        self._collect_properties(property_cache)
         self.diagonalize_triggermap()
 
-    def _collect_properties(self):
+    def _collect_properties(self, property_cache: Union[bool, str, Path] = False):
         self._str = self._info.ToString()
         self._name = self._info.DeviceName
         self._manufacturer = self._info.Manufacturer
-        with self.interface() as interface:
+        self._serial_number = int(self._info.SerialNumber)
+        with self.connection() as interface:
             _, soft, hard = interface.GetStgVersionInfo("", "")
             self._version = (soft, hard)
-            self._serial_number = int(self._info.SerialNumber)
-            self._crinua = (
-                interface.GetCurrentResolutionInNanoAmp(System.UInt32(0))
-                / 1000
-            )
-            self._crinma = interface.GetCurrentResolutionInNanoAmp(
-                System.UInt32(0)
-            ) / (1000 * 1000)
-            self._crngma = interface.GetCurrentRangeInNanoAmp(
-                System.UInt32(0)
-            ) / (1000 * 1000)
-            self._crngua = interface.GetCurrentRangeInNanoAmp(
-                System.UInt32(0)
-            ) / (1000)
-            self._vinuv = interface.GetVoltageResolutionInMicroVolt(
-                System.UInt32(0)
-            )
-            self._vrnguv = interface.GetVoltageRangeInMicroVolt(
-                System.UInt32(0)
-            ) / (1000)
-            self._dacr = interface.GetDACResolution()
-            self._achancnt = interface.GetNumberOfAnalogChannels()
-            self._trgincnt = interface.GetNumberOfTriggerInputs()
+            cache = _property_cache_path(property_cache)
+            props = _read_property_cache(cache, self._serial_number, self._version)
+            if props is None:
+                props = {
+                    "current_resolution_in_nA": interface.GetCurrentResolutionInNanoAmp(
+                        System.UInt32(0)
+                    ),
+                    "current_range_in_nA": interface.GetCurrentRangeInNanoAmp(
+                        System.UInt32(0)
+                    ),
+                    "voltage_resolution_in_uV": interface.GetVoltageResolutionInMicroVolt(
+                        System.UInt32(0)
+                    ),
+                    "voltage_range_in_uV": interface.GetVoltageRangeInMicroVolt(
+                        System.UInt32(0)
+                    ),
+                    "dac_resolution": interface.GetDACResolution(),
+                    "analog_channels": interface.GetNumberOfAnalogChannels(),
+                    "trigger_inputs": interface.GetNumberOfTriggerInputs(),
+                }
+                _write_property_cache(cache, self._serial_number, self._version, props)
+        self._crinua = props["current_resolution_in_nA"] / 1000
+        self._crinma = props["current_resolution_in_nA"] / (1000 * 1000)
+        self._crngma = props["current_range_in_nA"] / (1000 * 1000)
+        self._crngua = props["current_range_in_nA"] / (1000)
+        self._vinuv = props["voltage_resolution_in_uV"]
+        self._vrnguv = props["voltage_range_in_uV"] / (1000)
+        self._dacr = props["dac_resolution"]
+        self._achancnt = props["analog_channels"]
+        self._trgincnt = props["trigger_inputs"]
 
     @abstractmethod
     def diagonalize_triggermap(self):  # pragma no cover
@@ -213,6 +552,40 @@ class STGX(ABC):
     def interface(self):  # pragma no cover
         return DownloadInterface(self._info)
 
+    def connection(self):
+        "the open session if there is one, otherwise a new interface which connects for a single `with` block"
+        if self._session is not None:
+            return self._session
+        return self.interface()
+
+    def open_session(self):
+        "keep a single connection open for all following calls until :meth:`~.close_session`"
+        if self._session is None:
+            self._session = Session(self.interface())
+        self._session.open()
+
+    def close_session(self):
+        "close the connection opened with :meth:`~.open_session`"
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    @contextmanager
+    def session(self):
+        """keep the connection open for all calls within a `with` block
+
+        .. code-block:: python
+
+           with stg.session():
+               stg.download(0, [1, -1, 0], [0.1, 0.1, 49.8])
+               stg.start_stimulation([0])
+        """
+        self.open_session()
+        try:
+            yield self
+        finally:
+            self.close_session()
+
     def sleep(self, duration_in_ms: float):
         "sleep for duration in milliseconds"
         sleep(duration_in_ms / 1000)
@@ -312,10 +685,10 @@ class STGX(ABC):
             Indexing starts at 0.        
         """
         if channel_index == []:
-            with self.interface() as interface:
+            with self.connection() as interface:
                 interface.SetCurrentMode()
         else:
-            with self.interface() as interface:
+            with self.connection() as interface:
                 for chan in channel_index:
                     interface.SetCurrentMode(System.UInt32(chan))
 
@@ -331,9 +704,9 @@ class STGX(ABC):
         
         """
         if channel_index == []:
-            with self.interface() as interface:
+            with self.connection() as interface:
                 interface.SetVoltageMode()
         else:
-            with self.interface() as interface:
+            with self.connection() as interface:
                 for chan in channel_index:
                     interface.SetVoltageMode(System.UInt32(chan))
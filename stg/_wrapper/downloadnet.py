@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
-from typing import List
+from typing import List, NamedTuple, Dict, Tuple, Any, Optional, Iterable, Sequence, Union
+from contextlib import contextmanager
+from hashlib import blake2b
+import numpy as np
+from stg.pulsefile import canonicalize
 from stg._wrapper.dll import (
     System,
-    CURRENT,
-    VOLTAGE,
+    backend,
     available,
     select,
     DeviceInfo,
@@ -13,6 +16,112 @@ from stg._wrapper.dll import (
 )
 
 
+class Quantization(NamedTuple):
+    "a signal quantized for the STG, see :meth:`~.STG4000.quantize`"
+
+    amplitudes: np.ndarray  #: int32 amplitudes in nA/nV
+    durations: np.ndarray  #: uint64 durations in µs
+    amplitude_error: float  #: the largest rounding error of an amplitude in mA/mV
+    time_error: float  #: the largest rounding error of a segment boundary in ms
+    out_of_range: np.ndarray  #: indices of segments exceeding the range of the STG
+    charge: float  #: the net charge of the signal in µC
+    charge_balanced: bool  #: whether the net charge is below a single quantum
+    amplitude_range: float  #: the range of the STG in mA/mV
+    vanished: np.ndarray  #: indices of segments with an amplitude, but rounded to zero duration
+
+    def raise_for_range(self):
+        "raise a ValueError if any segment exceeds the range of the STG"
+        if self.out_of_range.size:
+            raise ValueError(
+                f"Segments {self.out_of_range.tolist()} exceed the range of "
+                f"±{self.amplitude_range} mA/mV"
+            )
+
+    def raise_for_vanished(self):
+        "raise a ValueError if any segment with an amplitude is too short for the time resolution of the STG"
+        if self.vanished.size:
+            raise ValueError(
+                f"Segments {self.vanished.tolist()} are shorter than half the "
+                "time resolution of the STG and would be dropped"
+            )
+
+
+class TriggerMap(NamedTuple):
+    "the configuration of all triggers, one entry per trigger, see :meth:`~.STG4000.setup_trigger`"
+
+    channelmap: Tuple[int, ...]  #: bitmap of the channels started by every trigger
+    syncoutmap: Tuple[int, ...]  #: bitmap of the sync outputs started by every trigger
+    repeat: Tuple[int, ...]  #: how often every trigger repeats the signals, 0 until stopped
+
+
+def _digest(amplitudes: np.ndarray, durations: np.ndarray) -> bytes:
+    "a content hash of a signal in the units of the STG"
+    h = blake2b(digest_size=16)
+    h.update(np.ascontiguousarray(amplitudes, dtype=np.int32).tobytes())
+    h.update(np.ascontiguousarray(durations, dtype=np.uint64).tobytes())
+    return h.digest()
+
+
+def _update_triggermap(
+    triggermap: TriggerMap,
+    trigger_index: int,
+    channel_index: Optional[List[int]],
+    syncout_index: Optional[List[int]],
+    repeat: Optional[int],
+) -> TriggerMap:
+    "return a copy of a trigger map with one trigger changed"
+    if not 0 <= trigger_index < len(triggermap.channelmap):
+        raise ValueError(f"Trigger {trigger_index} does not exist")
+    maps = [list(m) for m in triggermap]
+    for m, value in zip(maps, [channel_index, syncout_index]):
+        if value is not None:
+            m[trigger_index] = bitmap(value) or 0
+    if repeat is not None:
+        maps[2][trigger_index] = repeat
+    return TriggerMap(*(tuple(m) for m in maps))
+
+
+def _dotnet_triggermap(triggermap: TriggerMap):
+    "the trigger map as arguments for SetupTrigger"
+    return [System.Array[System.UInt32]([System.UInt32(v) for v in m]) for m in triggermap]
+
+
+class Shadow:
+    """what was last sent to the STG, see :meth:`~.STG4000.invalidate`
+
+    Entries are removed before a call to the STG and only stored again after it succeeded, so after a failed call the state of the channel is unknown and is sent again the next time.
+    """
+
+    def __init__(self):
+        self.modes: Dict[int, str] = {}  #: the mode of every channel
+        self.data: Dict[int, bytes] = {}  #: the digest of the signal of every channel
+        self.triggermap: Optional[TriggerMap] = None  #: the configuration of all triggers
+
+    def clear(self, channels: Optional[Iterable[int]] = None):
+        "forget the state of some channels, or everything if channels is None"
+        if channels is None:
+            self.modes.clear()
+            self.data.clear()
+            self.triggermap = None
+            return
+        for chan in channels:
+            self.modes.pop(chan, None)
+            self.data.pop(chan, None)
+
+    def has_mode(self, channels: Iterable[int], mode: str) -> bool:
+        return all(self.modes.get(chan) == mode for chan in channels)
+
+    def set_mode(self, channels: Iterable[int], mode: str):
+        for chan in channels:
+            if self.modes.get(chan) != mode:
+                # whatever was downloaded before is now in the wrong units
+                self.data.pop(chan, None)
+            self.modes[chan] = mode
+
+    def has_data(self, chan: int, digest: bytes, mode: str) -> bool:
+        return self.modes.get(chan) == mode and self.data.get(chan) == digest
+
+
 class STG4000(STGX):
     """
     This class implements the interface to download, start and stop stimulation. 
@@ -42,10 +151,27 @@ class STG4000(STGX):
 
     .. warning::
         
-       Please note, that in download mode, the Python object and the STG do not share states. More specifically, once a program is downloaded to the STG, it stays downloaded, even if you delete the object, instantiate a new one or reboot the PC. You can enforce a clean state by rebooting the STG or explicitly downloading and thereby overwriting the channels after instantiation. This behavior was kept for three reasons. First, this is also the behavior of the MCS GUI, and therefore less non-intuitive if you come from this direction. Second, it clearly shows that in download mode, PC and STG are not coupled, i.e. once downloaded, you can trigger without any USB connection. Third, clearing the downloaded programs during instantiation (or deletion of the object) would prevent the user from common use cases like recovering the STG after a restart of the kernel, deletion of the object or unplugging the USB cable. 
+       Please note, that in download mode, the STG does not report its state back to the Python object. More specifically, once a program is downloaded to the STG, it stays downloaded, even if you delete the object, instantiate a new one or reboot the PC. You can enforce a clean state by rebooting the STG or explicitly downloading and thereby overwriting the channels after instantiation. This behavior was kept for three reasons. First, this is also the behavior of the MCS GUI, and therefore less non-intuitive if you come from this direction. Second, it clearly shows that in download mode, PC and STG are not coupled, i.e. once downloaded, you can trigger without any USB connection. Third, clearing the downloaded programs during instantiation (or deletion of the object) would prevent the user from common use cases like recovering the STG after a restart of the kernel, deletion of the object or unplugging the USB cable. 
+
+    Every instance keeps a shadow of what it has sent to the STG, i.e. the mode and a hash of the signal of every channel and the trigger map. Downloading the same signal to a channel again, or setting a mode or trigger map which is already set, is skipped. If the STG was changed elsewhere, e.g. because it was power-cycled or another program downloaded to it, call :meth:`~.invalidate`, and everything is sent again.
 
     """
 
+    def __init__(self, *args, **kwargs):
+        self._shadow = Shadow()
+        self._triggermap: Optional[TriggerMap] = None
+        super().__init__(*args, **kwargs)
+
+    def invalidate(self, channel_index: List[int] = []):
+        """forget what was sent to the STG, so that it is sent again the next time
+
+        args
+        ----
+        channel_index: List[int]
+            defaults to [], which forgets the state of all channels and the trigger map. Give it a list of integers to forget only the signal and mode of specific channels.
+        """
+        self._shadow.clear(channel_index or None)
+
     def stop_stimulation(self, triggerIndex: List[int] = []):
         """stops all trigger inputs or a selection based on a list 
         
@@ -58,7 +184,7 @@ class STG4000(STGX):
 
         if triggerIndex == []:
             triggerIndex = [c for c in range(self.channel_count)]
-        with self.interface() as interface:
+        with self.connection() as interface:
             interface.SendStop(System.UInt32(bitmap(triggerIndex)))
 
     def start_stimulation(self, triggerIndex: List[int] = []):
@@ -73,7 +199,7 @@ class STG4000(STGX):
 
         if triggerIndex == []:
             triggerIndex = [c for c in range(self.channel_count)]
-        with self.interface() as interface:
+        with self.connection() as interface:
             interface.SendStart(System.UInt32(bitmap(triggerIndex)))
 
     def set_mode(self, channel_index: List[int] = [], mode: str = "current") -> int:
@@ -94,15 +220,19 @@ class STG4000(STGX):
 
         """
         if mode == "current":
-            self._set_current_mode(channel_index)
-            return CURRENT
+            setter, MODE = self._set_current_mode, backend().CURRENT
         elif mode == "voltage":
-            self._set_voltage_mode(channel_index)
-            return VOLTAGE
+            setter, MODE = self._set_voltage_mode, backend().VOLTAGE
         else:  # pragma no cover
             raise ValueError(
                 f"Unknow mode {mode}. select either 'current' or ' 'voltage'"
             )
+        channels = channel_index or range(self.channel_count)
+        if not self._shadow.has_mode(channels, mode):
+            self._shadow.clear(channels)
+            setter(channel_index)
+            self._shadow.set_mode(channels, mode)
+        return MODE
 
     def diagonalize_triggermap(self):
         """Give each trigger a sensible channel
@@ -116,15 +246,111 @@ class STG4000(STGX):
             +----------+---+---+---+---+---+---+---+---+
         
         """
-        channelmap = []
-        syncoutmap = []
-        repeat = []
-        for chan_idx in range(0, self.channel_count):
-            repeat.append(1)  # every trigger only once
-            syncoutmap.append(1 << chan_idx)  # diagonal triggerout
-            channelmap.append(1 << chan_idx)  # diagonal triggerin
-        with self.interface() as interface:
-            interface.SetupTrigger(0, channelmap, syncoutmap, repeat)
+        self.set_triggermap(self._diagonal_triggermap())
+
+    def _diagonal_triggermap(self) -> TriggerMap:
+        count = self.trigin_count
+        channels = tuple(
+            1 << idx if idx < self.channel_count else 0 for idx in range(count)
+        )
+        syncouts = tuple(1 << idx for idx in range(count))
+        # every trigger starts its channel and sync output once
+        return TriggerMap(channels, syncouts, (1,) * count)
+
+    @property
+    def triggermap(self) -> TriggerMap:
+        "the current configuration of all triggers"
+        if self._triggermap is None:
+            return self._diagonal_triggermap()
+        return self._triggermap
+
+    def set_triggermap(self, triggermap: TriggerMap):
+        """configure all triggers at once
+
+        The configuration is only sent to the STG if it differs from the one sent before, see :meth:`~.invalidate`.
+        """
+        triggermap = self._check_triggermap(triggermap)
+        self._triggermap = triggermap
+        if self._shadow.triggermap == triggermap:
+            return
+        self._shadow.triggermap = None
+        with self.connection() as interface:
+            interface.SetupTrigger(0, *_dotnet_triggermap(triggermap))
+        self._shadow.triggermap = triggermap
+
+    def setup_trigger(
+        self,
+        trigger_index: int = 0,
+        channel_index: Optional[List[int]] = None,
+        syncout_index: Optional[List[int]] = None,
+        repeat: Optional[int] = None,
+    ):
+        """configure which channels and sync outputs a trigger starts, and how often
+
+        args
+        ----
+        trigger_index: int
+            the trigger to configure. Indexing starts at 0
+        channel_index: List[int]
+            the channels started by this trigger. Defaults to None, which keeps the current channels
+        syncout_index: List[int]
+            the sync outputs started by this trigger. Defaults to None, which keeps the current sync outputs
+        repeat: int
+            how often the signals are repeated after the trigger, with 0 repeating until stimulation is stopped. Defaults to None, which keeps the current count
+
+        Repeating a signal on the STG is much faster than downloading it repeatedly. For example, instead of downloading a protocol of many identical bursts, download a single burst including the pause after it and let the STG repeat it:
+
+        .. code-block:: python
+
+           pf = PulseFile(intensity_in_mA=1, pulsewidth_in_ms=0.1)
+           amplitudes, durations = pf.compile()
+           stg.download(0, amplitudes + [0], durations + [ibi - sum(durations)])
+           stg.setup_trigger(0, channel_index=[0], repeat=count)
+           stg.start_stimulation([0])
+        """
+        self.set_triggermap(
+            _update_triggermap(
+                self.triggermap, trigger_index, channel_index, syncout_index, repeat
+            )
+        )
+
+    def set_repeat(self, trigger_index: int = 0, count: int = 1):
+        "set how often a trigger repeats its signals, see :meth:`~.setup_trigger`"
+        self.setup_trigger(trigger_index, repeat=count)
+
+    def _check_triggermap(self, triggermap: TriggerMap) -> TriggerMap:
+        triggermap = TriggerMap(*(tuple(int(v) for v in m) for m in triggermap))
+        count = self.trigin_count
+        if any(len(m) != count for m in triggermap):
+            raise ValueError(f"The trigger map needs one entry for each of {count} triggers")
+        channels = self.channel_count
+        if any(m < 0 or m >= 1 << channels for m in triggermap.channelmap):
+            raise ValueError(f"Channels must be between 0 and {channels - 1}")
+        # the STG4000 series has one sync output for every trigger input
+        if any(m < 0 or m >= 1 << count for m in triggermap.syncoutmap):
+            raise ValueError(f"Sync outputs must be between 0 and {count - 1}")
+        if any(r < 0 for r in triggermap.repeat):
+            raise ValueError("Repeat counts must not be negative")
+        return triggermap
+
+    @contextmanager
+    def batch(self):
+        """collect mode changes, downloads and trigger setup and send them at once
+
+        Within the `with` block, the returned :class:`~.Batch` offers :meth:`~.Batch.set_mode`, :meth:`~.Batch.download`, :meth:`~.Batch.download_native`, :meth:`~.Batch.setup_trigger`, :meth:`~.Batch.set_repeat` and :meth:`~.Batch.diagonalize_triggermap`. Signals are converted and validated immediately, but nothing is sent to the STG until the block ends. Then, everything is executed using a single connection, and the mode of every channel is set only once. If an exception is raised within the block, nothing is sent.
+
+        Example
+        -------
+
+        .. code-block:: python
+
+           with stg.batch() as batch:
+               for channel_index in range(stg.channel_count):
+                   batch.download(channel_index, [1, -1, 0], [0.1, 0.1, 49.8])
+        """
+        batch = Batch(self)
+        yield batch
+        batch.execute()
 
     def download(
         self,
@@ -132,6 +358,7 @@ class STG4000(STGX):
         amplitudes_in_mA: List[float,] = [0],
         durations_in_ms: List[float,] = [0],
         mode="current",
+        canonical: bool = True,
     ):
 
         """Download a stimulation signal 
@@ -154,6 +381,10 @@ class STG4000(STGX):
             amplitude is delivered
         mode: str
             defaults to current
+        canonical: bool
+            defaults to True, which shrinks the signal with :func:`~stg.pulsefile.canonicalize` before it is sent. Segments without duration are dropped, and adjacent segments with identical amplitude are merged. This reduces the USB traffic and the memory used on the STG without changing the output.
+
+        The signal is first converted with :meth:`~.quantize`, i.e. amplitudes and segment boundaries are rounded to the resolution of the STG. A ValueError is raised if any amplitude exceeds its range, or if a segment with an amplitude would be rounded to zero duration.
 
         Example
         -------
@@ -165,15 +396,281 @@ class STG4000(STGX):
                         durations_in_ms = [.1, .1, .488])
            
     
+        """
+        amplitudes, durations = self._convert(
+            amplitudes_in_mA, durations_in_ms, mode, canonical
+        )
+        self.download_native(channel_index, amplitudes, durations, mode)
+
+    def _convert(self, amplitudes_in_mA, durations_in_ms, mode: str, canonical: bool):
+        "quantize, validate and optionally canonicalize a signal for download"
+        q = self.quantize(amplitudes_in_mA, durations_in_ms, mode)
+        q.raise_for_range()
+        q.raise_for_vanished()
+        amplitudes, durations = q.amplitudes, q.durations
+        if canonical:
+            amplitudes, durations = canonicalize(amplitudes, durations)
+            if len(amplitudes) == 0:  # nothing left, e.g. the default [0], [0]
+                amplitudes, durations = q.amplitudes[:1] * 0, q.durations[:1] * 0
+        return amplitudes, durations
+
+    def quantize(
+        self,
+        amplitudes_in_mA: List[float,] = [0],
+        durations_in_ms: List[float,] = [0],
+        mode="current",
+    ) -> "Quantization":
+        """convert a signal into the units and resolution of the STG
+
+        args
+        ----
+        amplitudes_in_mA: List[float]
+            a list or array of amplitudes in mA/mV
+        durations_in_ms: List[float]
+            a list or array of durations in ms
+        mode: str
+            defaults to current
+
+        returns
+        -------
+        quantization: Quantization
+            the quantized signal as it would be sent with :meth:`~.download`, and a report of the quantization error, the segments exceeding the range of the STG and the net charge of the signal.
+
+        Amplitudes are rounded to the resolution of the DAC, and the boundaries between segments are rounded to the time resolution, so that rounding errors of durations do not add up. Everything is computed vectorized in one pass over the arrays. Nothing is clipped or dropped, check :attr:`~.Quantization.out_of_range` and :attr:`~.Quantization.vanished`, or call :meth:`~.Quantization.raise_for_range` and :meth:`~.Quantization.raise_for_vanished`.
         """
         if len(amplitudes_in_mA) != len(durations_in_ms):
             raise ValueError("Every amplitude needs a duration and vice versa!")
+        amplitudes = np.asarray(amplitudes_in_mA, dtype=np.float64) * 1000_000
+        durations = np.asarray(durations_in_ms, dtype=np.float64) * 1000
+        if durations.size and durations.min() < 0:
+            raise ValueError("Durations must not be negative")
+
+        a_res = self._amplitude_resolution_in_nA(mode)
+        t_res = self.time_resolution_in_us
+        a_range = self._amplitude_range_in_nA(mode)
+        qamps = np.rint(amplitudes / a_res) * a_res
+        ends = np.cumsum(durations)
+        qends = np.rint(ends / t_res) * t_res
+        qdurs = np.diff(qends, prepend=0)
+
+        out_of_range = np.flatnonzero(np.abs(qamps) > a_range)
+        vanished = np.flatnonzero((qdurs == 0) & (durations > 0) & (qamps != 0))
+        amplitude_error = np.abs(qamps - amplitudes).max(initial=0) / 1000_000
+        time_error = np.abs(qends - ends).max(initial=0) / 1000
+        charge = float(np.dot(qamps, qdurs)) / 1e9  # nA*µs in µC
+        # everything below a single quantum is as balanced as the STG can be
+        balanced = abs(charge) <= a_res * t_res / 1e9
+        return Quantization(
+            np.clip(qamps, -(2 ** 31), 2 ** 31 - 1).astype(np.int32),
+            qdurs.astype(np.uint64),
+            amplitude_error,
+            time_error,
+            out_of_range,
+            charge,
+            balanced,
+            a_range / 1000_000,
+            vanished,
+        )
+
+    def _amplitude_resolution_in_nA(self, mode: str) -> float:
+        "the resolution of amplitudes in the units sent to the STG, i.e. nA or nV"
+        if mode == "voltage":
+            return self.voltage_resolution_in_uV * 1000
+        return self.current_resolution_in_uA * 1000
 
-        amplitudes = [System.Int32(a * 1000_000) for a in amplitudes_in_mA]
-        durations = [System.UInt64(s * 1000) for s in durations_in_ms]
+    def _amplitude_range_in_nA(self, mode: str) -> float:
+        "the range of amplitudes in the units sent to the STG, i.e. nA or nV"
+        if mode == "voltage":
+            # GetVoltageRangeInMicroVolt is divided by 1000 when it is collected
+            return self.voltage_range_in_uV * 1000_000
+        return self.current_range_in_uA * 1000
 
+    def download_native(
+        self,
+        channel_index: int = 0,
+        amplitudes_in_nA: Union[Sequence[int], np.ndarray] = [0],
+        durations_in_us: Union[Sequence[int], np.ndarray] = [0],
+        mode="current",
+    ):
+        """Download a stimulation signal given in the units of the STG
+
+        This works like :meth:`~.download`, but takes integer amplitudes in nA and durations in µs, e.g. the arrays of a protocol opened with :func:`~stg.pulsefile.load_protocol`. They are not quantized, but validated as whole arrays, and non-integer values are rounded to the nearest nA/nV and µs.
+
+        args
+        ----
+        channel_index: int
+            The index of the channel for which to download the signal. Indexing
+            starts at 0
+        amplitudes_in_nA: Union[Sequence[int], np.ndarray]
+            a list or array of amplitudes in nA/nV
+        durations_in_us: Union[Sequence[int], np.ndarray]
+            a list or array of durations in µs
+        mode: str
+            defaults to current
+        """
+        amplitudes, durations, digest = self._native(
+            amplitudes_in_nA, durations_in_us, mode
+        )
+        if self._shadow.has_data(channel_index, digest, mode):
+            return
+        self._send(channel_index, amplitudes, durations, mode)
+        self._shadow.data[channel_index] = digest
+
+    def _native(self, amplitudes_in_nA, durations_in_us, mode: str):
+        "validate a signal in the units of the STG, and convert it into .NET arrays and their digest"
+        if len(amplitudes_in_nA) != len(durations_in_us):
+            raise ValueError("Every amplitude needs a duration and vice versa!")
+        amplitudes = np.asarray(amplitudes_in_nA)
+        durations = np.asarray(durations_in_us)
+        if np.issubdtype(amplitudes.dtype, np.floating):
+            amplitudes = np.rint(amplitudes)
+        if np.issubdtype(durations.dtype, np.floating):
+            durations = np.rint(durations)
+        a_range = self._amplitude_range_in_nA(mode)
+        if amplitudes.size and (amplitudes.min() < -a_range or amplitudes.max() > a_range):
+            raise ValueError(f"Amplitudes exceed the range of ±{a_range:.0f} nA/nV")
+        if durations.size and durations.min() < 0:
+            raise ValueError("Durations must not be negative")
+
+        amplitudes = amplitudes.astype(np.int32)
+        durations = durations.astype(np.uint64)
+        return (
+            System.Array[System.Int32](amplitudes.tolist()),
+            System.Array[System.UInt64](durations.tolist()),
+            _digest(amplitudes, durations),
+        )
+
+    def _send(self, channel_index: int, amplitudes, durations, mode: str):
+        "set the mode of the channel and send the converted data"
         MODE = self.set_mode([channel_index], mode)
-        with self.interface() as interface:
+        self._shadow.data.pop(channel_index, None)
+        with self.connection() as interface:
             interface.PrepareAndSendData(
                 System.UInt32(channel_index), amplitudes, durations, MODE
             )
+
+
+class Batch:
+    """Collects mode changes, downloads and trigger setup for :meth:`~.STG4000.batch`
+
+    The methods mirror the respective methods of :class:`~.STG4000`, but nothing is sent before :meth:`~.execute`. Like there, whatever is already set on the STG according to its shadow is skipped.
+    """
+
+    def __init__(self, stg: STG4000):
+        self._stg = stg
+        self._modes: Dict[int, str] = {}
+        self._data: List[Tuple[int, Any, Any, str, bytes]] = []
+        self._triggermap: Optional[TriggerMap] = None
+
+    def set_mode(self, channel_index: List[int] = [], mode: str = "current"):
+        "set a single or all channels to voltage or current mode"
+        if mode not in ("current", "voltage"):
+            raise ValueError(
+                f"Unknow mode {mode}. select either 'current' or ' 'voltage'"
+            )
+        for chan in channel_index or range(self._stg.channel_count):
+            self._modes[chan] = mode
+
+    def download(
+        self,
+        channel_index: int = 0,
+        amplitudes_in_mA: List[float,] = [0],
+        durations_in_ms: List[float,] = [0],
+        mode="current",
+        canonical: bool = True,
+    ):
+        "convert and validate a signal now, and download it when the batch is executed"
+        amplitudes, durations = self._stg._convert(
+            amplitudes_in_mA, durations_in_ms, mode, canonical
+        )
+        self.download_native(channel_index, amplitudes, durations, mode)
+
+    def download_native(
+        self,
+        channel_index: int = 0,
+        amplitudes_in_nA: Union[Sequence[int], np.ndarray] = [0],
+        durations_in_us: Union[Sequence[int], np.ndarray] = [0],
+        mode="current",
+    ):
+        "validate a signal in the units of the STG now, and download it when the batch is executed"
+        self.set_mode([channel_index], mode)
+        amplitudes, durations, digest = self._stg._native(
+            amplitudes_in_nA, durations_in_us, mode
+        )
+        self._data.append((channel_index, amplitudes, durations, mode, digest))
+
+    def diagonalize_triggermap(self):
+        "normalize the trigger map when the batch is executed"
+        self.set_triggermap(self._stg._diagonal_triggermap())
+
+    def set_triggermap(self, triggermap: TriggerMap):
+        "validate a configuration of all triggers now, and apply it when the batch is executed"
+        self._triggermap = self._stg._check_triggermap(triggermap)
+
+    def setup_trigger(
+        self,
+        trigger_index: int = 0,
+        channel_index: Optional[List[int]] = None,
+        syncout_index: Optional[List[int]] = None,
+        repeat: Optional[int] = None,
+    ):
+        "configure a trigger when the batch is executed, see :meth:`~.STG4000.setup_trigger`"
+        base = self._stg.triggermap if self._triggermap is None else self._triggermap
+        self.set_triggermap(
+            _update_triggermap(base, trigger_index, channel_index, syncout_index, repeat)
+        )
+
+    def set_repeat(self, trigger_index: int = 0, count: int = 1):
+        "set how often a trigger repeats its signals when the batch is executed"
+        self.setup_trigger(trigger_index, repeat=count)
+
+    def execute(self):
+        "send everything collected so far using a single connection"
+        shadow = self._stg._shadow
+        all_channels = set(range(self._stg.channel_count))
+        changed = {
+            chan: mode
+            for chan, mode in self._modes.items()
+            if not shadow.has_mode([chan], mode)
+        }
+        # the shadow is only updated for what was sent, see Shadow
+        data = [
+            (chan, amplitudes, durations, mode, digest)
+            for chan, amplitudes, durations, mode, digest in self._data
+            if chan in changed or not shadow.has_data(chan, digest, mode)
+        ]
+        triggermap = self._triggermap
+        if triggermap is not None:
+            self._stg._triggermap = triggermap
+        if triggermap == shadow.triggermap:
+            triggermap = None
+        shadow.clear(set(changed) | set(d[0] for d in data))
+        if triggermap is not None:
+            shadow.triggermap = None
+        with self._stg.connection() as interface:
+            modes = set(self._modes.values())
+            if changed and len(modes) == 1 and set(self._modes) == all_channels:
+                if modes == {"current"}:
+                    interface.SetCurrentMode()
+                else:
+                    interface.SetVoltageMode()
+            else:
+                for chan, mode in sorted(changed.items()):
+                    if mode == "current":
+                        interface.SetCurrentMode(System.UInt32(chan))
+                    else:
+                        interface.SetVoltageMode(System.UInt32(chan))
+            for chan, mode in self._modes.items():
+                shadow.set_mode([chan], mode)
+            for chan, amplitudes, durations, mode, digest in data:
+                MODE = backend().CURRENT if mode == "current" else backend().VOLTAGE
+                interface.PrepareAndSendData(
+                    System.UInt32(chan), amplitudes, durations, MODE
+                )
+                shadow.data[chan] = digest
+            if triggermap is not None:
+                interface.SetupTrigger(0, *_dotnet_triggermap(triggermap))
+                shadow.triggermap = triggermap
+        self._modes.clear()
+        self._data.clear()
+        self._triggermap = None
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+from typing import List, NamedTuple, Any, Optional, Iterable, Callable, Union
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+from time import perf_counter
+from stg._wrapper.downloadnet import STG4000
+
+
+class Result(NamedTuple):
+    "the outcome of a call dispatched to a single device of a :class:`~.DeviceGroup`"
+
+    serial: int  #: the serial number the device was opened with
+    value: Any  #: what the call returned, None if it failed
+    error: Optional[BaseException]  #: the exception raised by the call, None if it succeeded
+    duration_in_s: float  #: how long the call took for this device
+
+    @property
+    def ok(self) -> bool:
+        "whether the call succeeded"
+        return self.error is None
+
+
+class DeviceGroup:
+    """
+    Download, start and stop stimulation with several STGs at once
+
+    Every call is dispatched to all devices in parallel using a thread pool, so starting stimulation on four STGs takes roughly as long as for a single one. Each call returns a list with one :class:`~.Result` per device, in the order of the serial numbers. Errors are not raised, but reported in the result together with the time the call took for this device.
+
+    By default, a persistent session is opened for each device (see :meth:`~.STGX.open_session`), because connecting costs more than most calls. Close them with :meth:`~.close` or use the group in a `with` block.
+
+    Example
+    -------
+
+    .. code-block:: python
+
+        from stg.api import DeviceGroup
+
+        with DeviceGroup([12345, 12346]) as group:
+            group.download(0, [1, -1, 0], [0.1, 0.1, 49.8])
+            for result in group.start_stimulation([0]):
+                print(result.serial, result.ok, result.duration_in_s)
+
+    args
+    ----
+    serials: Iterable[int]
+        the serial numbers of the STGs
+    persistent: bool
+        whether to keep the connection to every device open until :meth:`~.close`
+    property_cache: Union[bool, str, Path]
+        passed on to every :class:`~.STG4000`
+    """
+
+    def __init__(
+        self,
+        serials: Iterable[int],
+        persistent: bool = True,
+        property_cache: Union[bool, str, Path] = False,
+    ):
+        self.serials = list(serials)
+        if not self.serials:
+            raise ValueError("A DeviceGroup needs at least one serial number")
+        self._pool = ThreadPoolExecutor(
+            max_workers=len(self.serials), thread_name_prefix="DeviceGroup"
+        )
+        opened = self._dispatch(
+            [
+                partial(STG4000, serial, persistent, property_cache)
+                for serial in self.serials
+            ]
+        )
+        failed = [result for result in opened if not result.ok]
+        if failed:
+            for result in opened:
+                if result.ok:
+                    result.value.close_session()
+            self._pool.shutdown()
+            raise ConnectionError(
+                "Could not open "
+                + ", ".join(f"SN {result.serial} ({result.error})" for result in failed)
+            ) from failed[0].error
+        self.devices: List[STG4000] = [result.value for result in opened]
+
+    def _dispatch(self, calls: List[Callable[[], Any]]) -> List[Result]:
+        def timed(serial: int, call: Callable[[], Any]) -> Result:
+            t0 = perf_counter()
+            try:
+                value = call()
+            except Exception as e:
+                return Result(serial, None, e, perf_counter() - t0)
+            return Result(serial, value, None, perf_counter() - t0)
+
+        futures = [
+            self._pool.submit(timed, serial, call)
+            for serial, call in zip(self.serials, calls)
+        ]
+        return [future.result() for future in futures]
+
+    def map(self, method: str, *args, **kwargs) -> List[Result]:
+        "call a method of :class:`~.STG4000` with the same arguments on all devices in parallel"
+        return self._dispatch(
+            [
+                partial(getattr(device, method), *args, **kwargs)
+                for device in self.devices
+            ]
+        )
+
+    def download(
+        self,
+        channel_index: int = 0,
+        amplitudes_in_mA: List[float] = [0],
+        durations_in_ms: List[float] = [0],
+        mode: str = "current",
+    ) -> List[Result]:
+        "download the same signal to a channel of every device, see :meth:`~.STG4000.download`"
+        return self.map(
+            "download", channel_index, amplitudes_in_mA, durations_in_ms, mode=mode
+        )
+
+    def start_stimulation(self, triggerIndex: List[int] = []) -> List[Result]:
+        "start stimulation on all devices, see :meth:`~.STG4000.start_stimulation`"
+        return self.map("start_stimulation", triggerIndex)
+
+    def stop_stimulation(self, triggerIndex: List[int] = []) -> List[Result]:
+        "stop stimulation on all devices, see :meth:`~.STG4000.stop_stimulation`"
+        return self.map("stop_stimulation", triggerIndex)
+
+    def close(self):
+        "close the sessions of all devices and shut down the thread pool"
+        self._dispatch([device.close_session for device in self.devices])
+        self._pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, type, value, tb):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def __getitem__(self, index: int) -> STG4000:
+        return self.devices[index]
@@ -0,0 +1,109 @@
+"""Latency instrumentation for calls into the DLL
+
+All calls to the DLL pass through :class:`~stg._wrapper.dll.BasicInterface`. When a :class:`LatencyRecorder` is installed with :func:`~stg._wrapper.dll.start_instrumentation`, every call is timed and counted per method. Frequently called methods are bound when a connection is established, so they are timed for every connection established after instrumentation was started.
+"""
+import json
+import threading
+from math import log2
+from pathlib import Path
+from time import perf_counter
+from typing import Callable, Dict, Union
+
+_STEPS = 8  #: histogram buckets per doubling of the latency, i.e. < 9% error
+
+
+class _Histogram:
+    "a log-spaced latency histogram with constant memory"
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets: Dict[int, int] = {}
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        idx = int(log2(seconds * 1e9) * _STEPS) if seconds > 1e-9 else 0
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+
+    def percentile(self, q: float) -> float:
+        "the upper edge of the bucket containing the q-th percentile in s"
+        rank = q / 100 * self.count
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                return min(2 ** ((idx + 1) / _STEPS) / 1e9, self.max)
+        return self.max  # pragma no cover
+
+
+class LatencyRecorder:
+    """Records call counts and latency histograms per DLL method
+
+    Recording costs two calls to :func:`time.perf_counter` and a dictionary update per call, so it is cheap enough to leave it on.
+
+    Example
+    -------
+
+    .. code-block:: python
+
+       from stg._wrapper.dll import start_instrumentation
+
+       recorder = start_instrumentation()
+       stg.download(0, [1, -1, 0], [0.1, 0.1, 49.8])
+       print(recorder.summary()["PrepareAndSendData"])
+       recorder.dump("latency.json")
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[str, _Histogram] = {}
+
+    def record(self, name: str, seconds: float):
+        "add the latency of a single call"
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = _Histogram()
+            histogram.add(seconds)
+
+    def wrap(self, name: str, method: Callable) -> Callable:
+        "return a version of method which records its latency under name"
+
+        def timed(*args, **kwargs):
+            t0 = perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.record(name, perf_counter() - t0)
+
+        return timed
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        "call count and mean, p50, p99 and max latency in ms for every method"
+        with self._lock:
+            return {
+                name: {
+                    "count": h.count,
+                    "mean_ms": h.total / h.count * 1000,
+                    "p50_ms": h.percentile(50) * 1000,
+                    "p99_ms": h.percentile(99) * 1000,
+                    "max_ms": h.max * 1000,
+                }
+                for name, h in sorted(self._histograms.items())
+            }
+
+    def dump(self, filename: Union[str, Path]):
+        "write the :meth:`~.summary` as json"
+        fname = Path(str(filename)).expanduser().absolute()
+        fname.write_text(json.dumps(self.summary(), indent=2))
+
+    def reset(self):
+        "forget all recorded calls"
+        with self._lock:
+            self._histograms.clear()
@@ -35,10 +35,26 @@ DeviceEnumNet.MCS_STG_DEVICE = None
 STG_DestinationEnumNet = _mock
 
 
+class Array(list):
+    "mimics a .NET array, created with System.Array[System.Int16](values)"
+
+    @staticmethod
+    def CreateInstance(type, length: int) -> "Array":
+        return Array([type()] * length)
+
+    @staticmethod
+    def Copy(source, source_index, destination, destination_index, length):
+        destination[destination_index : destination_index + length] = source[
+            source_index : source_index + length
+        ]
+
+
 System = MagicMock()
 System.UInt32 = int
+System.UInt64 = int
+System.Int32 = int
 System.Int16 = int
-System.Array = list
+System.Array = Array
 
 
 def DataQueueSpace():
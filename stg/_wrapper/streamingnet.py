@@ -1,5 +1,5 @@
 import threading
-from typing import List, Dict, Callable
+from typing import List, Dict, Callable, Optional, Tuple, Any, NamedTuple
 from stg._wrapper.dll import (
     StreamingInterface,
     CStg200xStreamingNet,
@@ -8,16 +8,100 @@ from stg._wrapper.dll import (
     DeviceInfo,
 )
 from stg._wrapper.downloadnet import STG4000 as STG4000DL
-from stg.pulsefile import decompress
+from stg.pulsefile import CompressedSignal
+import numpy as np
 import time
 
 
-def queue(device, signal: List[int], chan: int = 0):
-    space = device.GetDataQueueSpace(chan)
-    if space < len(signal):
-        return 0
-    device.EnqueueData(chan, System.Array[System.Int16](signal))
-    return space - device.GetDataQueueSpace(chan)
+class RingCursor:
+    """the read position of the streaming thread in the signal of a channel
+
+    The signal is read as a ring, i.e. after its last sample, the next period starts with its first sample. A new signal set for the channel is picked up at the start of the next period, or at the sample requested with :meth:`~.SignalMapping.set`. Then, the new signal starts with its first sample, so no period is cut short or repeated except at the requested sample.
+
+    Whole periods are enqueued as the device-ready array of the signal. Everything else is copied from this array into a reusable staging array of :code:`block` samples, so a partial period costs no conversion in Python. Without a block size, exactly as many samples are enqueued as there is space for.
+    """
+
+    __slots__ = ("chan", "block", "loaded", "signal", "array", "position", "buffer", "staging")
+
+    def __init__(self, chan: int, block: Optional[int] = None):
+        self.chan = chan
+        self.block = block
+        self.loaded: Optional[Prepared] = None
+        # empty until the first signal is loaded at position 0
+        self.signal: CompressedSignal = CompressedSignal([], [])
+        self.array = None
+        self.position = 0
+        self.buffer = np.empty(0, np.int16)
+        self.staging = None
+
+    def _advance(self, signals: "SignalMapping") -> int:
+        "switch to the latest signal if it is due, and return where the current run of samples ends"
+        latest = signals.prepared(self.chan)
+        if latest is not self.loaded and (
+            self.position == 0 or self.position == latest.switch_at_sample
+        ):
+            self.loaded = latest
+            self.signal, self.array = latest.signal, latest.array
+            self.position = 0
+        stop = len(self.signal)
+        if latest is not self.loaded and latest.switch_at_sample is not None:
+            if self.position < latest.switch_at_sample < stop:
+                stop = latest.switch_at_sample  # switch right there
+        return stop
+
+    def _copy(self, count: int, staging, offset: int):
+        "copy samples from the cursor into the staging array"
+        source, start = self.array, self.position
+        if source is None:  # too long to be prepared, i.e. expanded piecewise
+            if len(self.buffer) < count:
+                self.buffer = np.empty(count, np.int16)
+            samples = self.signal.expand(start, start + count, out=self.buffer)
+            source, start = System.Array[System.Int16](samples.tolist()), 0
+        System.Array.Copy(source, start, staging, offset, count)
+
+    def _stage(self, size: int):
+        "the reusable staging array, reallocated only if its size changed"
+        if self.staging is None or len(self.staging) != size:
+            self.staging = System.Array.CreateInstance(System.Int16, size)
+        return self.staging
+
+    def fill(self, device, space: int, signals: "SignalMapping") -> int:
+        "enqueue as many samples as there is space for, continuing at the cursor, and return how many"
+        sent = 0
+        while sent < space:
+            stop = self._advance(signals)
+            length = len(self.signal)
+            if length == 0:
+                break
+            if (
+                self.position == 0
+                and stop == length
+                and self.array is not None
+                and length <= space - sent
+            ):
+                device.EnqueueData(self.chan, self.array)
+                sent += length
+                continue
+            size = self.block or space - sent
+            if space - sent < size:
+                break
+            staging = self._stage(size)
+            staged = 0
+            while staged < size:
+                stop = self._advance(signals)
+                length = len(self.signal)
+                if length == 0:  # the new signal is empty, send what we have
+                    partial = System.Array.CreateInstance(System.Int16, staged)
+                    System.Array.Copy(staging, 0, partial, 0, staged)
+                    device.EnqueueData(self.chan, partial)
+                    return sent + staged
+                count = min(size - staged, stop - self.position)
+                self._copy(count, staging, staged)
+                staged += count
+                self.position = (self.position + count) % length
+            device.EnqueueData(self.chan, staging)
+            sent += size
+        return sent
 
 
 def set_capacity(device, capacity: int):
@@ -51,23 +135,71 @@ def diagonalize_triggermap(device, callback_percent: int = 10):
     device.SetupTrigger(cmap, syncmap, digoutmap, autostart, callback_threshold)
 
 
+class Prepared(NamedTuple):
+    "a signal prepared for the streaming thread, see :meth:`~.SignalMapping.prepared`"
+
+    signal: CompressedSignal  #: the signal in device units
+    array: Any  #: the signal as device-ready array, None if it is too long
+    switch_at_sample: Optional[int]  #: where to switch from the previous signal
+
+
 class SignalMapping(dict):
+    """maps channels to their :class:`~stg.pulsefile.CompressedSignal` in device units
+
+    Values can be set as a :class:`~stg.pulsefile.CompressedSignal` or as a sequence of samples, both in mA. They are stored run-length encoded as int16. Signals of up to :attr:`~.max_prepared` samples are additionally converted once into an array ready to be enqueued, see :meth:`~.prepared`.
+
+    Signals are completely prepared before they are published with a single assignment, so reading never blocks and never sees a partially updated channel. Only writers are serialized by the lock.
+    """
+
     lock = threading.Lock()
     _scalar = 2_000  #: to make 1 equal to 1mA in current mode
+    max_prepared: int = 1 << 20  #: the longest signal which is kept as a device-ready array
 
     def __init__(self):
         super().__init__()
+        self._prepared: Dict[int, Prepared] = {}
 
     def __setitem__(self, key, value):
+        self.set(key, value)
+
+    def set(self, key, value, switch_at_sample: Optional[int] = None):
+        """set the signal of a channel
+
+        args
+        ----
+        key: int
+            the channel
+        value: CompressedSignal
+            the signal in mA
+        switch_at_sample: Optional[int]
+            defaults to None, which lets the streaming thread switch to this signal at the end of the current period of the previous one. Otherwise, it switches as soon as it reaches this sample of the current period, or at its end if it is already past it.
+        """
+        if type(key) != int or key < 0 or key > 7:
+            raise ValueError("Key must be a possible channel from 0-7")
+        if switch_at_sample is not None and switch_at_sample < 0:
+            raise ValueError("The sample to switch at must not be negative")
+        if not isinstance(value, CompressedSignal):
+            value = CompressedSignal.from_samples(np.asarray(value, dtype=np.float64))
+        try:
+            value = value.astype(np.int16, scale=self._scalar)
+        except ValueError:
+            raise ValueError("Amplitude exceeds the range of the STG")
+        array = None
+        if len(value) <= self.max_prepared:
+            array = System.Array[System.Int16](value.tolist())
+        prepared = Prepared(value, array, switch_at_sample)
         with self.lock:
-            if type(key) != int or key < 0 or key > 7:
-                raise ValueError("Key must be a possible channel from 0-7")
-            value = [int(v) * self._scalar for v in value]
+            # published for the streaming thread before the channel is listed
+            self._prepared[key] = prepared
             super().__setitem__(key, value)
 
-    def __getitem__(self, key) -> List[int]:
-        with self.lock:
-            return super().__getitem__(key)
+    def channels(self) -> List[int]:
+        "the channels with a signal prepared for the streaming thread"
+        return list(self._prepared)
+
+    def prepared(self, key) -> Prepared:
+        "the latest signal of a channel, prepared for the streaming thread"
+        return self._prepared[key]
 
 
 # -----------------------------------------------------------------------------
@@ -87,13 +219,15 @@ class STG4000Streamer(STG4000DL):
         *Small buffers have the advantage of a low latency between data generation in the callback funtion and its output as a analog signal from the STG. However for low latency to work, the user-written callback function has to be fast and to produce a steady flow of data.*
         
 
-    For you, that means you have to set two parameters carefully when you initialize the streaming mode with :meth:`~.start_streaming`. These parameters are the :code:`buffer_in_s`, which defines the size of the buffer in the DLL, and the :code:`capacity_in_s`, which defines the size of the buffer on the STG. Both buffers need to be at least as large the the signal you want to buffer. Yet, larger buffer means that the latency when updating it becomes larger, too. Too short buffers will fail without error, and too large buffers might cause 
+    For you, that means you have to set two parameters carefully when you initialize the streaming mode with :meth:`~.start_streaming`. These parameters are the :code:`buffer_in_s`, which defines the size of the buffer in the DLL, and the :code:`capacity_in_s`, which defines the size of the buffer on the STG. Larger buffers mean that the latency when updating the signal becomes larger, too. Too short buffers will fail without error, and too large buffers might cause 
 
-    Streaming is implemented by constantly reading the stimulation signal you have set with :meth:`~.set_signal` for each channel, and pushing this signal into the DLL-buffer as soon as there is enough space. This is done within its own thread, and if you use :meth:`~.set_signal` it is thread-safe. Yet, space in the DLL becomes available at the speed the STG pulls data from the DLL. That means not only that there is a natural jitter, but there are also racing conditions if you update your signal faster than data is actually being pulled from the STG. 
+    Streaming is implemented by constantly reading the stimulation signal you have set with :meth:`~.set_signal` for each channel, and pushing as many samples into the DLL-buffer as there is space for, in blocks of :code:`callback_percent` of the buffer. The signal is read like a ring with a cursor for each channel, so the DLL-buffer stays full, and signals can be longer than the buffer. This is done within its own thread, and if you use :meth:`~.set_signal` it is thread-safe. The new signal is prepared by the caller and swapped in by the streaming thread at the end of the current period of the old one, or at a requested sample, so there are no partial or duplicated periods. Yet, the swap happens when the samples are enqueued, and the samples already in the buffers are still put out. That means a signal takes effect with the latency of the buffers, and if you update your signal faster than data is actually being pulled from the STG, intermediate signals are skipped.
     
+    In every round, the channels are serviced by the space free in their buffer, the emptiest first, so a channel with a long period does not delay the others. How often the buffer of a channel ran empty is counted in :attr:`~.underruns`.
+
     .. note::
     
-       * Uncontrolled racing conditions when adapting stimulation online
+       * Updates take effect with the latency of the buffers
        * Extensively test the optimal buffer sizes for your stimulation signal
     
     Example
@@ -123,9 +257,48 @@ class STG4000Streamer(STG4000DL):
 
     """
 
-    _streaming = threading.Event()
     _outputrate: int = 50_000
-    _signals = SignalMapping()
+
+    def __init__(self, *args, **kwargs):
+        self._streaming = threading.Event()
+        self._wakeup = threading.Event()
+        self._signals = SignalMapping()
+        self._started = threading.Event()
+        self._dll_buffer_size = 0
+        self._queue_space: Dict[int, int] = {}
+        self._underruns: Dict[int, int] = {}
+        self._watchers: List[Callable[[], None]] = []
+        super().__init__(*args, **kwargs)
+
+    @property
+    def started(self) -> bool:
+        "whether the streaming thread is running and pushing data into the DLL"
+        return self._started.is_set()
+
+    def buffer_level(self, channel_index: int = 0) -> int:
+        "the number of samples queued in the DLL buffer for a channel, as last seen by the streaming thread"
+        space = self._queue_space.get(channel_index, self._dll_buffer_size)
+        return max(0, self._dll_buffer_size - space)
+
+    @property
+    def underruns(self) -> Dict[int, int]:
+        "how often the DLL buffer of each channel was found empty since streaming started"
+        return dict(self._underruns)
+
+    def subscribe(self, callback: Callable[[], None]):
+        """call back whenever the streaming state changes
+
+        The callback takes no arguments and is called from the streaming thread after streaming started or stopped and whenever the level of a buffer was updated, i.e. very often. It has to return quickly, and can read :attr:`~.started` and :meth:`~.buffer_level`.
+        """
+        self._watchers.append(callback)
+
+    def unsubscribe(self, callback: Callable[[], None]):
+        "stop calling back a function registered with :meth:`~.subscribe`"
+        self._watchers.remove(callback)
+
+    def _notify(self):
+        for callback in tuple(self._watchers):
+            callback()
 
     @property
     def output_rate_in_hz(self) -> int:
@@ -137,6 +310,7 @@ class STG4000Streamer(STG4000DL):
         channel_index: int = 0,
         amplitudes_in_mA: List[float,] = [0],
         durations_in_ms: List[float,] = [0],
+        switch_at_sample: Optional[int] = None,
     ):
         """sets the signal to be continually appended to the buffer
         
@@ -147,18 +321,20 @@ class STG4000Streamer(STG4000DL):
         amplitudes_in_mA: List[float,] = [0]
             a list of amplitudes in mA
         durations_in_ms: List[float,] = [0]
-        a list of durations in ms
+            a list of durations in ms
+        switch_at_sample: Optional[int] = None
+            defaults to None, which starts the new signal at the end of the current period of the previous one. Otherwise, the new signal starts when the streaming thread reaches this sample of the current period.
 
 
-        The amplitudes and durations are decompressed (:meth:`~.stg.pulsefile.decompress`) to the sampling rate defined in :attr:`~.output_rate_in_hz`.
+        The amplitudes and durations are converted into a :class:`~stg.pulsefile.CompressedSignal` at the sampling rate defined in :attr:`~.output_rate_in_hz`, and into an array ready to be enqueued by the streaming thread. Only very long signals are expanded whenever they are enqueued, see :class:`~.SignalMapping`.
         
         """
-        signal = decompress(
+        signal = CompressedSignal.from_durations(
             amplitudes_in_mA=amplitudes_in_mA,
             durations_in_ms=durations_in_ms,
             rate_in_hz=self._outputrate,
         )
-        self._signals[channel_index] = signal
+        self._signals.set(channel_index, signal, switch_at_sample)
 
     def streamer(self, dll_buffer_size: int = 5_000):
         return StreamingInterface(self._info, buffer_size=dll_buffer_size)
@@ -182,6 +358,11 @@ class STG4000Streamer(STG4000DL):
         rate = self.output_rate_in_hz
         capacity = int(rate * capacity_in_s)
         buffer_size = int(rate * buffer_in_s)
+        self._dll_buffer_size = buffer_size
+        self._queue_space.clear()
+        self._underruns.clear()
+        # streaming changes mode, memory and trigger map of the STG behind the shadow
+        self.invalidate()
         with self.streamer(buffer_size) as device:
             device.SetCurrentMode()
             device.EnableContinousMode()
@@ -197,19 +378,26 @@ class STG4000Streamer(STG4000DL):
                 device.SendStart(System.UInt32(i))
             # everything is prepared. we release the barrier, so that
             # the caller, i.e. start_streaming, may return now.
+            self._started.set()
             barrier.wait()
+            self._notify()
             print("Start streaming")
+            cursors: Dict[int, RingCursor] = {}
+            # refill as soon as this many samples are free in the buffer of any channel
+            threshold = max(1, buffer_size * callback_percent // 100)
             try:
                 # run as long as desired or until an exception is raised
                 while self._streaming.is_set():
-                    # go through all the signals set for the channels
-                    for chan, sig in self._signals.items():
-                        sent = queue(device, signal=sig, chan=chan)
-                        while not sent:
-                            sent = queue(device, signal=sig, chan=chan)
-                            # put here to allow to break as fast as possible
-                            if self._streaming.is_set() == False:
-                                break
+                    most_space, total = self._service(
+                        device, cursors, buffer_size, threshold
+                    )
+                    # the STG drains every buffer at the output rate, so we
+                    # sleep until the first one falls below the threshold
+                    wait = (threshold - most_space) / rate
+                    if wait <= 0 and total == 0:  # nothing to send at all
+                        wait = threshold / rate
+                    if wait > 0:
+                        self._wakeup.wait(wait)
 
             except Exception as e:  # pragma no cover
                 print(f"Exception: {repr(e)}")
@@ -218,6 +406,36 @@ class STG4000Streamer(STG4000DL):
                     device.SendStop(System.UInt32(i))
                 device.StopLoop()
                 device.Disconnect()
+                self._started.clear()
+                self._notify()
+
+    def _service(
+        self,
+        device,
+        cursors: Dict[int, RingCursor],
+        buffer_size: int,
+        block: Optional[int] = None,
+    ) -> Tuple[int, int]:
+        """fill the DLL buffers of all channels, the emptiest first, in blocks of samples
+
+        Returns the largest space left in any buffer, and how many samples were sent in total.
+        """
+        spaces = [(device.GetDataQueueSpace(chan), chan) for chan in self._signals.channels()]
+        most_space = 0
+        total = 0
+        for space, chan in sorted(spaces, reverse=True):
+            cursor = cursors.get(chan)
+            if cursor is None:
+                cursor = cursors[chan] = RingCursor(chan, block)
+            elif space >= buffer_size:  # the STG pulled everything we had sent
+                self._underruns[chan] = self._underruns.get(chan, 0) + 1
+            sent = cursor.fill(device, space, self._signals)
+            self._queue_space[chan] = space - sent
+            most_space = max(most_space, space - sent)
+            total += sent
+            if self._watchers:
+                self._notify()
+        return most_space, total
 
     def start_streaming(
         self,
@@ -236,10 +454,14 @@ class STG4000Streamer(STG4000DL):
         buffer_in_s: float = 0.1
             the size of the buffer on the STG
         callback_percent: int = 10
-            at what state of the DLL-buffer the DLL should request new data. Should have no effect in this implementation, because we constanly push data into the buffer as soon as there is enough space.
+            at what state of the DLL-buffer new data is needed. The streaming thread fills the buffers completely, and then sleeps until this percentage of the buffer of any channel has been pulled by the STG at the output rate.
+
+        The streaming thread needs its own connection, so a session opened with :meth:`~.open_session` is closed first.
         
         """
+        self.close_session()
         barrier = threading.Barrier(2)
+        self._wakeup.clear()
         self._streaming.set()
         self._t = threading.Thread(
             target=self._stream,
@@ -260,6 +482,7 @@ class STG4000Streamer(STG4000DL):
         """closes the thread started when calling :meth:`~.start_streaming` gracefully
         """
         self._streaming.clear()
+        self._wakeup.set()
         if hasattr(self, "_t"):
             self._t.join()
             del self._t
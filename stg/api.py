@@ -1,2 +1,14 @@
-from stg.pulsefile import PulseFile, entrain, decompress
+from stg.pulsefile import (
+    PulseFile,
+    CompressedSignal,
+    Segments,
+    entrain,
+    entrain_segments,
+    decompress,
+    decompress_array,
+    dump_protocol,
+    load_protocol,
+)
 from stg._wrapper.streamingnet import STG4000Streamer as STG4000
+from stg._wrapper.group import DeviceGroup
+from stg._wrapper.asyncnet import AsyncSTG4000
@@ -0,0 +1,96 @@
+"""Micro-benchmarks for the host-side parts of the toolbox
+
+Run with :code:`python -m stg.example.speed`. All benchmarks also run without an STG, i.e. against the mock on Linux.
+"""
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from stg.pulsefile import PulseFile, dump, load
+
+
+def bench_dump(burstcount: int = 100_000, channels: int = 2) -> float:
+    "returns how many lines per second :func:`~stg.pulsefile.dump` writes"
+    pulsefiles = [PulseFile(burstcount=burstcount) for _ in range(channels)]
+    lines = sum(len(p.intensity) + 1 for p in pulsefiles) * burstcount
+    with TemporaryDirectory() as folder:
+        fname = Path(folder) / "bench.dat"
+        t0 = time.perf_counter()
+        dump(pulsefiles, fname)
+        dt = time.perf_counter() - t0
+    return lines / dt
+
+
+def bench_load(burstcount: int = 100_000, channels: int = 2) -> float:
+    "returns how many rows per second :func:`~stg.pulsefile.load` parses"
+    pulsefiles = [PulseFile(burstcount=burstcount) for _ in range(channels)]
+    with TemporaryDirectory() as folder:
+        fname = Path(folder) / "bench.dat"
+        dump(pulsefiles, fname)
+        t0 = time.perf_counter()
+        protocol = load(fname)
+        dt = time.perf_counter() - t0
+    return sum(len(amps) for amps, _ in protocol.values()) / dt
+
+
+def bench_session(calls: int = 1_000) -> dict:
+    "returns the latency of :meth:`~.STG4000.start_stimulation` in s, with and without a persistent session"
+    from stg._wrapper.downloadnet import STG4000
+
+    latency = {}
+    with redirect_stdout(StringIO()):  # the mock prints every connect
+        stg = STG4000()
+        for name, persistent in (("per_call", False), ("persistent", True)):
+            if persistent:
+                stg.open_session()
+            t0 = time.perf_counter()
+            for _ in range(calls):
+                stg.start_stimulation([0])
+            latency[name] = (time.perf_counter() - t0) / calls
+        stg.close_session()
+    return latency
+
+
+def bench_dispatch(calls: int = 100_000) -> dict:
+    "returns the overhead of calling the DLL in s, with dynamic lookup and bound at connect"
+    from stg._wrapper.dll import MockingInterface
+
+    overhead = {}
+    with redirect_stdout(StringIO()):
+        with MockingInterface("bench") as interface:
+            lookup = interface.__getattr__  # what every call cost before binding
+            t0 = time.perf_counter()
+            for _ in range(calls):
+                lookup("GetDataQueueSpace")(0)
+            overhead["getattr"] = (time.perf_counter() - t0) / calls
+            t0 = time.perf_counter()
+            for _ in range(calls):
+                interface.GetDataQueueSpace(0)
+            overhead["bound"] = (time.perf_counter() - t0) / calls
+    return overhead
+
+
+def bench_streaming(duration_in_s: float = 2.0) -> float:
+    "returns the CPU time used by the process per second of streaming, i.e. 1.0 for a busy core"
+    from stg._wrapper.streamingnet import STG4000Streamer
+
+    with redirect_stdout(StringIO()):
+        stg = STG4000Streamer()
+        stg.set_signal(0, [1, -1, 0], [0.1, 0.1, 49.8])
+        stg.start_streaming(capacity_in_s=0.1)
+        t0, c0 = time.perf_counter(), time.process_time()
+        time.sleep(duration_in_s)
+        load = (time.process_time() - c0) / (time.perf_counter() - t0)
+        stg.stop_streaming()
+    return load
+
+
+if __name__ == "__main__":
+    print(f"dump: {bench_dump():,.0f} lines/s")
+    print(f"load: {bench_load():,.0f} rows/s")
+    for name, latency in bench_session().items():
+        print(f"start_stimulation ({name}): {latency*1e6:,.1f} µs/call")
+    for name, overhead in bench_dispatch().items():
+        print(f"GetDataQueueSpace ({name}): {overhead*1e9:,.0f} ns/call")
+    print(f"streaming: {bench_streaming():.1%} CPU")
@@ -1,6 +1,9 @@
 from itertools import chain, repeat, accumulate
+from functools import lru_cache
 from pathlib import Path
-from typing import Tuple, List, Union
+from typing import Tuple, List, Union, Iterator, Optional, Dict, NamedTuple, Sequence
+import json
+import numpy as np
 
 FileName = Union[Path, str]
 
@@ -23,9 +26,18 @@ class PulseFile:
 
 
     After initialization, run  :meth:`~.compile` to generate amplitudes and durations. These can be downloadwed with STG4000s :meth:`~.stg._wrapper.downloadnet.STG4000.download`
+
+    A PulseFile is immutable and hashable, i.e. two pulsefiles with the same parameters are equal. Compiled and decompressed outputs are kept in a bounded cache keyed on these parameters, so compiling the same pulsefile again is nearly free. Use :meth:`~.cache_info` to inspect the hits and misses of the cache.
     
     """
 
+    __slots__ = ("intensity", "pulsewidth", "mode", "burstcount", "isi")
+    intensity: Tuple[float, ...]
+    pulsewidth: Tuple[float, ...]
+    mode: str
+    burstcount: int
+    isi: float
+
     def __init__(
         self,
         intensity_in_mA: float = 1,
@@ -35,12 +47,14 @@ class PulseFile:
         isi_in_ms: float = 49.8,
     ):
 
+        intensity: Tuple[float, ...]
+        pulsewidth: Tuple[float, ...]
         if mode == "biphasic":
-            intensity = [intensity_in_mA, -intensity_in_mA]
-            pulsewidth = [pulsewidth_in_ms, pulsewidth_in_ms]
+            intensity = (intensity_in_mA, -intensity_in_mA)
+            pulsewidth = (pulsewidth_in_ms, pulsewidth_in_ms)
         elif mode == "monophasic":
-            intensity = [intensity_in_mA]
-            pulsewidth = [pulsewidth_in_ms]
+            intensity = (intensity_in_mA,)
+            pulsewidth = (pulsewidth_in_ms,)
         else:
             raise NotImplementedError(f"Unknown mode {mode}")
 
@@ -53,11 +67,12 @@ class PulseFile:
         if isi_in_ms < 0:
             raise ValueError("Minimum ISI must be 0ms")
 
-        self.intensity: List[float] = intensity
-        self.pulsewidth: List[float] = pulsewidth
-        self.mode: str = mode
-        self.burstcount: int = burstcount
-        self.isi: float = isi_in_ms
+        # PulseFiles are frozen, so we have to bypass our own __setattr__
+        object.__setattr__(self, "intensity", intensity)
+        object.__setattr__(self, "pulsewidth", pulsewidth)
+        object.__setattr__(self, "mode", mode)
+        object.__setattr__(self, "burstcount", burstcount)
+        object.__setattr__(self, "isi", isi_in_ms)
 
     def compile(self):
         """compile the pulsefile to compressed amps and durs
@@ -70,12 +85,35 @@ class PulseFile:
             a list of durations
 
         """
-        amps = [a for a in chain(self.intensity, [0])]
-        durs = [d for d in chain(self.pulsewidth, [self.isi])]
-        amps = chain(*repeat(amps, self.burstcount))  # repeat
-        durs = chain(*repeat(durs, self.burstcount))  # repeat
+        amps, durs = _compile(self)
         return list(amps), list(durs)
 
+    def decompress(self, rate_in_hz: int = 50_000) -> np.ndarray:
+        """the pulsefile continuously sampled at the given rate
+
+        returns
+        -------
+        signal: np.ndarray
+            a read-only float32 array, see :func:`~.decompress_array`
+        """
+        return _decompress(self, rate_in_hz)
+
+    def segments(self) -> "Segments":
+        "a lazy view on the compiled amplitudes and durations, see :class:`~.Segments`"
+        burst = zip(chain(self.intensity, [0]), chain(self.pulsewidth, [self.isi]))
+        return Segments(burst, count=self.burstcount)
+
+    @staticmethod
+    def cache_info() -> dict:
+        "hits, misses and size of the caches for compiled and decompressed pulsefiles"
+        return {"compile": _compile.cache_info(), "decompress": _decompress.cache_info()}
+
+    @staticmethod
+    def cache_clear():
+        "empty the caches for compiled and decompressed pulsefiles"
+        _compile.cache_clear()
+        _decompress.cache_clear()
+
     @property
     def duration_in_ms(self):
         "the duration of the complete stimulation including all bursts"
@@ -87,27 +125,202 @@ class PulseFile:
     def dump(self, fname):
         dump([self], fname)
 
+    def _key(self) -> tuple:
+        return (self.intensity, self.pulsewidth, self.mode, self.burstcount, self.isi)
 
-def init_datfile(filename: FileName):
+    def __setattr__(self, name, value):
+        raise AttributeError("A PulseFile is immutable. Create a new one instead.")
+
+    def __delattr__(self, name):
+        raise AttributeError("A PulseFile is immutable. Create a new one instead.")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, PulseFile):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __reduce__(self):
+        args = (self.intensity[0], self.mode, self.pulsewidth[0], self.burstcount, self.isi)
+        return (PulseFile, args)
+
+    def __repr__(self) -> str:
+        return (
+            f"PulseFile(intensity_in_mA={self.intensity[0]}, mode={self.mode!r}, "
+            f"pulsewidth_in_ms={self.pulsewidth[0]}, burstcount={self.burstcount}, "
+            f"isi_in_ms={self.isi})"
+        )
+
+
+@lru_cache(maxsize=128)
+def _compile(pulsefile: PulseFile) -> Tuple[Tuple[float, ...], Tuple[float, ...]]:
+    amps, durs = pulsefile.segments().compile()
+    return tuple(amps), tuple(durs)
+
+
+@lru_cache(maxsize=16)
+def _decompress(pulsefile: PulseFile, rate_in_hz: int) -> np.ndarray:
+    signal = decompress_array(*_compile(pulsefile), rate_in_hz=rate_in_hz)
+    signal.flags.writeable = False  # shared between all callers
+    return signal
+
+
+class Segments:
+    """A lazy, periodic sequence of (amplitude_in_mA, duration_in_ms) segments
+
+    args
+    ----
+    unit: Iterable[Tuple[float, float]]
+        the segments which are repeated, e.g. a burst. This can be another :class:`~.Segments`, which allows to nest repetitions without expanding them.
+    count: int = 1
+        how often the unit is repeated
+    gap_in_ms: Optional[float] = None
+        if given, repetitions are separated by a segment with amplitude 0 and this duration
+
+
+    Length, duration and random access are computed from the unit in O(1), and segments are only created when you iterate over them. Use :attr:`~.amplitudes_in_mA` and :attr:`~.durations_in_ms` to pass them to :meth:`~stg._wrapper.downloadnet.STG4000.download` or :meth:`~stg._wrapper.streamingnet.STG4000Streamer.set_signal`, or :meth:`~.compile` them into lists.
+    """
+
+    def __init__(self, unit, count: int = 1, gap_in_ms: Optional[float] = None):
+        if count < 0:
+            raise ValueError("Count must not be negative")
+        if gap_in_ms is not None and gap_in_ms < 0:
+            raise ValueError("Minimum gap must be 0ms")
+        self.unit: Union["Segments", Tuple[Tuple[float, float], ...]]
+        if isinstance(unit, Segments):
+            self.unit = unit
+            unit_duration = unit.duration_in_ms
+        else:
+            self.unit = tuple((a, d) for a, d in unit)
+            unit_duration = sum(d for _, d in self.unit)
+        self.count = count
+        self.gap_in_ms = gap_in_ms
+        self._period = len(self.unit) + (gap_in_ms is not None)
+        self._length = max(0, count * self._period - (gap_in_ms is not None))
+        self._duration = count * unit_duration + max(0, count - 1) * (gap_in_ms or 0)
+
+    @property
+    def duration_in_ms(self) -> float:
+        "the total duration of all segments"
+        return self._duration
+
+    @property
+    def amplitudes_in_mA(self) -> "_Column":
+        "a lazy view on the amplitudes"
+        return _Column(self, 0)
+
+    @property
+    def durations_in_ms(self) -> "_Column":
+        "a lazy view on the durations"
+        return _Column(self, 1)
+
+    def compile(self) -> Tuple[List[float], List[float]]:
+        """expand all segments into preallocated lists
+
+        returns
+        ------
+        amplitudes_in_mA: List[float]
+            a list of amplitudes
+        durations_in_ms: List[float]
+            a list of durations
+        """
+        if isinstance(self.unit, Segments):
+            amps, durs = self.unit.compile()
+        else:
+            amps = [a for a, _ in self.unit]
+            durs = [d for _, d in self.unit]
+        if self.count == 0:
+            return [], []
+        if self.gap_in_ms is None:
+            return amps * self.count, durs * self.count
+        rest = self.count - 1
+        return amps + ([0] + amps) * rest, durs + ([self.gap_in_ms] + durs) * rest
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, index: int) -> Tuple[float, float]:
+        if index < 0:
+            index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("Segment index out of range")
+        position = index % self._period
+        if position == len(self.unit):
+            assert self.gap_in_ms is not None  # only a gap extends the period
+            return (0, self.gap_in_ms)
+        return self.unit[position]
+
+    def __iter__(self) -> Iterator[Tuple[float, float]]:
+        for cnt in range(self.count):
+            if cnt and self.gap_in_ms is not None:
+                yield (0, self.gap_in_ms)
+            yield from self.unit
+
+    def __repr__(self) -> str:
+        return f"Segments({len(self)} segments, {self.duration_in_ms} ms)"
+
+
+class _Column:
+    "a lazy view on either the amplitudes or the durations of :class:`~.Segments`"
+
+    def __init__(self, segments: Segments, field: int):
+        self._segments = segments
+        self._field = field
+
+    def __len__(self) -> int:
+        return len(self._segments)
+
+    def __getitem__(self, index: int) -> float:
+        return self._segments[index][self._field]
+
+    def __iter__(self) -> Iterator[float]:
+        return (segment[self._field] for segment in self._segments)
+
+    def __array__(self, dtype=None, copy=None) -> np.ndarray:
+        return np.fromiter(self, dtype=dtype or np.float64, count=len(self))
+
+
+DATFILE_HEADER = [
+    "Multi Channel Systems MC_Stimulus II\n",
+    "ASCII import Version 1.10\n",
+    "\n",
+    "channels: 2\n",
+    "\n",
+    "output mode: current\n",
+    "\n",
+    "format: 4\n",
+    "\n",
+]  # : the header for every MCS II .dat file
+
+
+def _datfile(filename: FileName) -> Path:
     fname = Path(str(filename)).expanduser().absolute()
     if fname.suffix != ".dat":
         raise ValueError("Only .dat files can be saved")
+    return fname
 
-    stim_info = [
-        "Multi Channel Systems MC_Stimulus II\n",
-        "ASCII import Version 1.10\n",
-        "\n",
-        "channels: 2\n",
-        "\n",
-        "output mode: current\n",
-        "\n",
-        "format: 4\n",
-        "\n",
-    ]  # : the header for every MCS II .dat file
 
+def init_datfile(filename: FileName):
+    fname = _datfile(filename)
     with fname.open("w") as f:
-        for line in stim_info:
-            f.write(line)
+        f.writelines(DATFILE_HEADER)
+
+
+def _channel_header(channel: int) -> List[str]:
+    "the header for every channel, indexing starts at 0"
+    return [f"channel: {channel+1}\n", "\n", "value\ttime\n"]
+
+
+def _encode_burst(pulsefile) -> List[str]:
+    "the lines of a single burst, formatted once and reused for every repetition"
+    burst = [
+        f"{amp}\t{pw*1000}\n"  # scale to µA/µs
+        for amp, pw in zip(pulsefile.intensity, pulsefile.pulsewidth)
+    ]
+    burst.append(f"0\t{pulsefile.isi*1000}\n")  # scale to µs
+    return burst
 
 
 def encode(pulsefile, channel: int = 0) -> List[str]:
@@ -126,26 +339,16 @@ def encode(pulsefile, channel: int = 0) -> List[str]:
     content:str
         the content of the file
     """
-    stim_info = [
-        f"channel: {channel+1}\n",
-        "\n",
-        "value\ttime\n",
-    ]  # : the header for every channel
-
-    stim_commands = []
-    for _ in range(0, pulsefile.burstcount):
-        for amp, pw in zip(pulsefile.intensity, pulsefile.pulsewidth):
-            newline = f"{amp}\t{pw*1000}\n"  # scale to µA/µs
-            stim_commands.append(newline)
-
-        newline = f"0\t{pulsefile.isi*1000}\n"  # scale to µs
-        stim_commands.append(newline)
-
-    stim_info.extend(stim_commands)
+    stim_info = _channel_header(channel)
+    stim_info.extend(_encode_burst(pulsefile) * pulsefile.burstcount)
     return stim_info
 
 
-def dump(pulsefiles: List[PulseFile], filename: FileName = "~/Desktop/test.dat"):
+def dump(
+    pulsefiles: List[PulseFile],
+    filename: FileName = "~/Desktop/test.dat",
+    buffer_size: int = 1 << 20,
+):
     """save Pulsefiles into a dat file readable by `MC Stimulus II <https://www.multichannelsystems.com/software/mc-stimulus-ii>`_
 
     args
@@ -154,18 +357,442 @@ def dump(pulsefiles: List[PulseFile], filename: FileName = "~/Desktop/test.dat")
         a list of pulsefiles. The order defines the channel for which the respective pulsefile will be stored
     filename: Union[str, Path] = '~/Desktop/test.dat'
         the filename of the file
+    buffer_size: int = 1 << 20
+        size of the write buffer in bytes
+
+
+    The file is written in a single pass. Every burst is formatted once and written repeatedly in chunks of about :code:`buffer_size`.
+    """
+    fname = _datfile(filename)
+    with fname.open("w", buffering=buffer_size) as f:
+        f.writelines(DATFILE_HEADER)
+        for idx, pulsefile in enumerate(pulsefiles):
+            if idx > 0:
+                f.write("\n")
+            f.writelines(_channel_header(idx))
+            burst = "".join(_encode_burst(pulsefile))
+            per_chunk = max(1, buffer_size // len(burst))
+            remaining = pulsefile.burstcount
+            while remaining > 0:
+                count = min(per_chunk, remaining)
+                f.write(burst * count)
+                remaining -= count
+
+
+def load(
+    filename: FileName, chunk_lines: int = 1 << 16
+) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+    """load a dat file written by :func:`~.dump` or MC Stimulus II
+
+    args
+    ----
+    filename: Union[str, Path]
+        the filename of the file
+    chunk_lines: int = 65536
+        how many rows are parsed at once. The file is read incrementally, and at most this many rows are held as text.
+
+    returns
+    -------
+    channels: Dict[int, Tuple[np.ndarray, np.ndarray]]
+        maps the index of every channel in the file to its amplitudes and durations_in_ms. Indexing starts at 0, and durations are scaled from µs back to ms.
+
+
+    Example
+    -------
+
+    .. code-block:: python
+
+       for channel_index, (amplitudes, durations) in load("protocol.dat").items():
+           stg.download(channel_index, amplitudes, durations)
     """
     fname = Path(str(filename)).expanduser().absolute()
-    init_datfile(fname)
+    if fname.suffix != ".dat":
+        raise ValueError("Only .dat files can be loaded")
+
+    chunks: Dict[int, List[np.ndarray]] = {}
+    rows: List[str] = []
+    channel = -1
+
+    def flush():
+        if not rows:
+            return
+        try:
+            values = np.loadtxt(rows, dtype=np.float64, ndmin=2)
+        except ValueError:  # a cell is not a number, or rows differ in length
+            values = np.empty((0, 0))
+        if values.shape != (len(rows), 2):
+            raise ValueError(f"Malformed row in channel {channel+1} of {fname}")
+        chunks[channel].append(values)
+        rows.clear()
+
     with fname.open("r") as f:
-        lines = f.readlines()
-    for idx, pulsefile in enumerate(pulsefiles):
-        if idx > 0:
-            lines.append("\n")
-        lines.extend(encode(pulsefile, channel=idx))
-    with fname.open("w") as f:
-        for line in lines:
-            f.write(line)
+        if not f.readline().startswith("Multi Channel Systems MC_Stimulus"):
+            raise ValueError(f"{fname} is not a MC_Stimulus II file")
+        values = False  # whether the rows of the current channel started
+        for line in f:
+            line = line.strip()
+            if line and line[0] in "0123456789-+.":
+                if channel < 0:
+                    raise ValueError(f"Values before the first channel in {fname}")
+                rows.append(line)
+                if len(rows) >= chunk_lines:
+                    flush()
+                continue
+            flush()
+            if line.startswith("channel:"):
+                channel = int(line.split(":")[1]) - 1
+                if channel < 0:
+                    raise ValueError(f"Channels are counted from 1 in {fname}")
+                chunks[channel] = []
+                values = False
+            elif line.split() == ["value", "time"]:
+                values = True
+            elif line and values:
+                raise ValueError(f"Malformed row in channel {channel+1} of {fname}")
+        flush()
+
+    channels = {}
+    for channel, parts in chunks.items():
+        data = np.concatenate(parts) if parts else np.empty((0, 2))
+        channels[channel] = (data[:, 0].copy(), data[:, 1] / 1000)  # scale from µs
+    return channels
+
+
+class Protocol(NamedTuple):
+    "a compiled protocol as returned by :func:`~.load_protocol`"
+
+    mode: str  #: the output mode, i.e. "current" or "voltage"
+    rate_in_hz: int  #: the output rate
+    #: maps channel indices to int32 amplitudes in nA and uint64 durations in µs
+    channels: Dict[int, Tuple[np.ndarray, np.ndarray]]
+
+
+_PROTOCOL_MAGIC = b"STGPROT1"
+
+
+def _aligned(offset: int, alignment: int = 8) -> int:
+    return -(-offset // alignment) * alignment
+
+
+def dump_protocol(
+    channels: Dict[int, Tuple[List[float], List[float]]],
+    filename: FileName,
+    mode: str = "current",
+    rate_in_hz: int = 50_000,
+):
+    """save a compiled protocol into a binary .stg file
+
+    args
+    ----
+    channels: Dict[int, Tuple[List[float], List[float]]]
+        maps channel indices to amplitudes_in_mA and durations_in_ms, e.g. as returned by :func:`~.load`
+    filename: Union[str, Path]
+        the filename of the file
+    mode: str = "current"
+        the output mode stored with the protocol
+    rate_in_hz: int = 50_000
+        the output rate stored with the protocol
+
+
+    Amplitudes are stored as int32 in nA and durations as uint64 in µs, i.e. in the units :meth:`~stg._wrapper.downloadnet.STG4000.download` sends to the STG. The file starts with a small JSON header describing where the arrays of every channel are located. All arrays are 8-byte aligned, which allows :func:`~.load_protocol` to memory-map them.
+    """
+    fname = Path(str(filename)).expanduser().absolute()
+    if fname.suffix != ".stg":
+        raise ValueError("Only .stg files can be saved")
+    if mode not in ("current", "voltage"):
+        raise ValueError(f"Unknown mode {mode}. select either 'current' or 'voltage'")
+
+    arrays = []
+    for index, (amplitudes_in_mA, durations_in_ms) in sorted(channels.items()):
+        if len(amplitudes_in_mA) != len(durations_in_ms):
+            raise ValueError("Every amplitude needs a duration and vice versa")
+        amplitudes = np.rint(np.asarray(amplitudes_in_mA, dtype=np.float64) * 1000_000)
+        durations = np.rint(np.asarray(durations_in_ms, dtype=np.float64) * 1000)
+        # casting would silently wrap around, possibly back into the range of the STG
+        if amplitudes.size and (
+            amplitudes.min() < -(2 ** 31) or amplitudes.max() > 2 ** 31 - 1
+        ):
+            raise ValueError(f"Amplitudes of channel {index} exceed the range of int32 in nA")
+        if durations.size and (durations.min() < 0 or durations.max() >= 2 ** 64):
+            raise ValueError(f"Durations of channel {index} must be between 0 and 2**64 µs")
+        arrays.append((int(index), amplitudes.astype("<i4"), durations.astype("<u8")))
+
+    # the header stores offsets, which depend on the size of the header itself
+    layout = []
+    offset = 0
+    for index, amplitudes, durations in arrays:
+        durations_at = _aligned(offset + amplitudes.nbytes)
+        layout.append(
+            {
+                "index": index,
+                "count": len(amplitudes),
+                "amplitudes": offset,
+                "durations": durations_at,
+            }
+        )
+        offset = _aligned(durations_at + durations.nbytes)
+    header = json.dumps({"mode": mode, "rate_in_hz": rate_in_hz, "channels": layout})
+    header_bytes = header.encode("utf-8")
+    data_at = _aligned(len(_PROTOCOL_MAGIC) + 8 + len(header_bytes))
+
+    with fname.open("wb") as f:
+        f.write(_PROTOCOL_MAGIC)
+        f.write(np.array([data_at, len(header_bytes)], dtype="<u4").tobytes())
+        f.write(header_bytes)
+        for entry, (_, amplitudes, durations) in zip(layout, arrays):
+            f.seek(data_at + entry["amplitudes"])
+            f.write(amplitudes.tobytes())
+            f.seek(data_at + entry["durations"])
+            f.write(durations.tobytes())
+        f.truncate(data_at + offset)
+
+
+def load_protocol(filename: FileName) -> Protocol:
+    """open a binary .stg file written by :func:`~.dump_protocol`
+
+    args
+    ----
+    filename: Union[str, Path]
+        the filename of the file
+
+    returns
+    -------
+    protocol: Protocol
+        the mode, rate and channels of the protocol. The arrays are read-only memory-maps into the file, i.e. opening even large protocols is instant and their content is only read when it is used.
+
+
+    Example
+    -------
+
+    .. code-block:: python
+
+       protocol = load_protocol("protocol.stg")
+       for channel_index, (amplitudes, durations) in protocol.channels.items():
+           stg.download_native(channel_index, amplitudes, durations, protocol.mode)
+    """
+    fname = Path(str(filename)).expanduser().absolute()
+    with fname.open("rb") as f:
+        if f.read(len(_PROTOCOL_MAGIC)) != _PROTOCOL_MAGIC:
+            raise ValueError(f"{fname} is not a binary STG protocol")
+        data_at, header_length = np.frombuffer(f.read(8), dtype="<u4").tolist()
+        header = json.loads(f.read(header_length).decode("utf-8"))
+
+    channels = {}
+    for entry in header["channels"]:
+        count = entry["count"]
+        if count == 0:  # mmap can not map zero bytes
+            amplitudes, durations = np.empty(0, "<i4"), np.empty(0, "<u8")
+        else:
+            amplitudes = np.memmap(
+                fname, "<i4", "r", offset=data_at + entry["amplitudes"], shape=(count,)
+            )
+            durations = np.memmap(
+                fname, "<u8", "r", offset=data_at + entry["durations"], shape=(count,)
+            )
+        channels[entry["index"]] = (amplitudes, durations)
+    return Protocol(header["mode"], header["rate_in_hz"], channels)
+
+
+def _sample_counts(
+    amplitudes_in_mA, durations_in_ms, rate_in_hz: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    "validate and convert amplitudes and durations into amplitudes and sample counts"
+    if rate_in_hz not in [50_000, 10_000]:
+        raise ValueError("Rate must be either 10 or 50kHz")
+    if len(amplitudes_in_mA) != len(durations_in_ms):
+        raise ValueError("Every amplitude needs a duration and vice versa")
+
+    amplitudes = np.asarray(amplitudes_in_mA, dtype=np.float64)
+    durations = np.asarray(durations_in_ms, dtype=np.float64)
+    counts = (durations * (rate_in_hz / 1000)).astype(np.int64)
+    np.clip(counts, 0, None, out=counts)  # negative durations yield no samples
+    return amplitudes, counts
+
+
+def _cast(amplitudes: np.ndarray, dtype, scale: float = 1) -> np.ndarray:
+    "scale and cast amplitudes, rounding and range-checking for integer dtypes"
+    if scale != 1:
+        amplitudes = amplitudes * scale
+    if np.issubdtype(dtype, np.integer):
+        info = np.iinfo(dtype)
+        amplitudes = np.rint(amplitudes)
+        if amplitudes.size and (
+            amplitudes.min() < info.min or amplitudes.max() > info.max
+        ):
+            raise ValueError(f"Amplitudes exceed the range of {np.dtype(dtype)}")
+    return amplitudes.astype(dtype)
+
+
+def decompress_array(
+    amplitudes_in_mA: Sequence[float] = [0],
+    durations_in_ms: Sequence[float] = [0],
+    rate_in_hz: int = 50_000,
+    dtype=np.float32,
+    scale: float = 1,
+) -> np.ndarray:
+    """decompress amplitudes and durations into a typed array sampled at the given rate
+
+    args
+    ------
+    amplitudes_in_mA: List[float,] = [0]
+        a list or array of amplitudes
+    durations_in_ms: List[float,] = [0]
+        a list or array of the respective durations
+    rate_in_hz: int = 50_000
+        the sampling rate of the decompressed signal
+    dtype = np.float32
+        the dtype of the returned array, e.g. :code:`np.int16` for device units
+    scale: float = 1
+        every amplitude is multiplied by this factor before it is cast. Amplitudes are rounded to the nearest integer if the dtype is an integer type.
+
+    returns
+    -------
+    signal: np.ndarray
+        a one-dimensional array comprising the signal continuously sampled at the given rate
+
+    Every duration is converted independently into a number of samples and truncated, i.e. the result has exactly the samples :func:`decompress` would return.
+    """
+    amplitudes, counts = _sample_counts(amplitudes_in_mA, durations_in_ms, rate_in_hz)
+    return np.repeat(_cast(amplitudes, dtype, scale), counts)
+
+
+class CompressedSignal:
+    """A sampled signal stored as run-length segments of amplitude and sample count
+
+    args
+    ----
+    amplitudes: array-like
+        the amplitude of each segment
+    counts: array-like
+        for how many samples the respective amplitude is held
+
+    A biphasic pulse followed by a long inter-stimulus interval requires only three segments instead of thousands of samples. The signal behaves like the sequence of its samples, i.e. it has a length, can be indexed, iterated and compared with a list, but samples are only created when you :meth:`~.expand` it.
+
+    Segments without samples are dropped during initialization.
+    """
+
+    def __init__(self, amplitudes, counts):
+        amplitudes = np.asarray(amplitudes)
+        counts = np.asarray(counts, dtype=np.int64)
+        if amplitudes.shape != counts.shape:
+            raise ValueError("Every amplitude needs a count and vice versa")
+        if counts.size and counts.min() < 0:
+            raise ValueError("Counts must not be negative")
+        keep = counts > 0
+        self.amplitudes: np.ndarray = amplitudes[keep]
+        self.counts: np.ndarray = counts[keep]
+        self._ends = np.cumsum(self.counts)
+
+    @classmethod
+    def from_durations(
+        cls,
+        amplitudes_in_mA: List[float,] = [0],
+        durations_in_ms: List[float,] = [0],
+        rate_in_hz: int = 50_000,
+    ) -> "CompressedSignal":
+        """create a signal from amplitudes and durations
+
+        The durations are converted into sample counts exactly like :func:`decompress` does it.
+        """
+        amplitudes, counts = _sample_counts(amplitudes_in_mA, durations_in_ms, rate_in_hz)
+        return cls(amplitudes, counts)
+
+    @classmethod
+    def from_samples(cls, samples) -> "CompressedSignal":
+        "create a signal by run-length encoding continuously sampled amplitudes"
+        samples = np.asarray(samples)
+        if samples.size == 0:
+            return cls(samples[:0], [])
+        starts = np.flatnonzero(np.concatenate(([True], samples[1:] != samples[:-1])))
+        counts = np.diff(np.append(starts, samples.size))
+        return cls(samples[starts], counts)
+
+    def astype(self, dtype, scale: float = 1) -> "CompressedSignal":
+        """return a copy with scaled amplitudes of the given dtype
+
+        Amplitudes are rounded to the nearest integer if the dtype is an integer type, and a ValueError is raised if they exceed its range.
+        """
+        amplitudes = _cast(self.amplitudes.astype(np.float64), dtype, scale)
+        return CompressedSignal(amplitudes, self.counts)
+
+    def segments(self) -> Iterator[Tuple[float, int]]:
+        "iterate over the segments as tuples of amplitude and sample count"
+        return zip(self.amplitudes.tolist(), self.counts.tolist())
+
+    def expand(self, start: int = 0, stop: Optional[int] = None, out=None) -> np.ndarray:
+        """expand the samples from start to stop
+
+        args
+        ----
+        start: int = 0
+            the index of the first sample
+        stop: Optional[int] = None
+            the index after the last sample, defaults to the end of the signal
+        out: np.ndarray
+            an optional buffer with room for at least :code:`stop - start` samples. It is filled in place and can be reused for every call to prevent allocations.
+
+        returns
+        -------
+        samples: np.ndarray
+            the expanded samples. If a buffer was given, this is a view into it.
+        """
+        length = len(self)
+        stop = length if stop is None else min(stop, length)
+        start = max(0, min(start, stop))
+        if out is None:
+            out = np.empty(stop - start, dtype=self.amplitudes.dtype)
+        elif len(out) < stop - start:
+            raise ValueError("The buffer is too small")
+        samples = out[: stop - start]
+        if stop == start:
+            return samples
+        first = int(np.searchsorted(self._ends, start, side="right"))
+        last = int(np.searchsorted(self._ends, stop, side="left"))
+        if last - first > 64:  # many short segments, e.g. an arbitrary waveform
+            ends = np.clip(self._ends[first : last + 1], start, stop)
+            counts = np.diff(ends, prepend=start)
+            samples[:] = np.repeat(self.amplitudes[first : last + 1], counts)
+            return samples
+        pos = 0
+        for idx in range(first, last + 1):
+            end = min(int(self._ends[idx]), stop) - start
+            samples[pos:end] = self.amplitudes[idx]
+            pos = end
+        return samples
+
+    def tolist(self) -> List[float]:
+        "expand the complete signal into a list"
+        return np.repeat(self.amplitudes, self.counts).tolist()
+
+    def __len__(self) -> int:
+        return int(self._ends[-1]) if self._ends.size else 0
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.tolist()[key]
+        if key < 0:
+            key += len(self)
+        if not 0 <= key < len(self):
+            raise IndexError("Sample index out of range")
+        idx = int(np.searchsorted(self._ends, key, side="right"))
+        return self.amplitudes[idx].item()
+
+    def __iter__(self):
+        for amplitude, count in self.segments():
+            yield from repeat(amplitude, count)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, CompressedSignal):
+            return np.array_equal(self.counts, other.counts) and np.array_equal(
+                self.amplitudes, other.amplitudes
+            )
+        try:
+            return len(self) == len(other) and self.tolist() == list(other)
+        except TypeError:
+            return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"CompressedSignal({len(self.counts)} segments, {len(self)} samples)"
 
 
 def decompress(
@@ -189,17 +816,63 @@ def decompress(
     signal: List[float]
         a list of amplitudes comprising the signal continuously sampled at the given rate
 
+    This is a thin wrapper around :func:`decompress_array`, use the latter if you do not need a list.
     """
-    if rate_in_hz not in [50_000, 10_000]:
-        raise ValueError("Rate must be either 10 or 50kHz")
-    rate_in_khz = rate_in_hz / 1000
-    if len(amplitudes_in_mA) != len(durations_in_ms):
-        raise ValueError("Every amplitude needs a duration and vice versa")
+    return decompress_array(
+        amplitudes_in_mA=amplitudes_in_mA,
+        durations_in_ms=durations_in_ms,
+        rate_in_hz=rate_in_hz,
+        dtype=np.float64,
+    ).tolist()
+
+
+def canonicalize(
+    amplitudes: Union[Sequence[float], np.ndarray],
+    durations: Union[Sequence[float], np.ndarray],
+    amplitude_resolution: Optional[float] = None,
+    time_resolution: Optional[float] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """shrink a compressed signal to the fewest segments describing the same output
 
-    signal = []
-    for a, d in zip(amplitudes_in_mA, durations_in_ms):
-        signal.extend([a] * int(d * rate_in_khz))
-    return signal
+    args
+    ----
+    amplitudes: Union[Sequence[float], np.ndarray]
+        a list or array of amplitudes
+    durations: Union[Sequence[float], np.ndarray]
+        a list or array of the respective durations
+    amplitude_resolution: Optional[float] = None
+        if given, amplitudes are rounded to multiples of this resolution
+    time_resolution: Optional[float] = None
+        if given, the boundaries between segments are rounded to multiples of this resolution. Rounding the boundaries instead of every single duration keeps the total duration on the grid, i.e. errors do not accumulate.
+
+    returns
+    -------
+    amplitudes: np.ndarray
+        the amplitudes of the remaining segments
+    durations: np.ndarray
+        the durations of the remaining segments
+
+
+    After quantization, segments without duration are dropped and adjacent segments with identical amplitude are merged. Integer input stays integer, so this works best in the units of the STG, i.e. nA and µs.
+    """
+    if len(amplitudes) != len(durations):
+        raise ValueError("Every amplitude needs a duration and vice versa")
+    amps = np.asarray(amplitudes)
+    durs = np.asarray(durations)
+    adtype, ddtype = amps.dtype, durs.dtype
+    if amplitude_resolution:
+        amps = np.rint(amps / amplitude_resolution) * amplitude_resolution
+    if time_resolution:
+        ends = np.rint(np.cumsum(durs, dtype=np.float64) / time_resolution)
+        durs = np.diff(ends * time_resolution, prepend=0)
+    amps, durs = amps.astype(adtype), durs.astype(ddtype)
+
+    keep = durs > 0
+    amps, durs = amps[keep], durs[keep]
+    if amps.size == 0:
+        return amps, durs
+    starts = np.flatnonzero(np.concatenate(([True], amps[1:] != amps[:-1])))
+    return amps[starts], np.add.reduceat(durs, starts)
 
 
 # --------
@@ -227,14 +900,29 @@ def entrain(
         a list of amplitudes
     durs: List[float]
         a list of durations
+
+    The lists are preallocated in one go. Use :func:`~.entrain_segments` if you do not need them expanded.
     """
-    inamps, indurs = pulsefile.compile()
-    for cnt in range(count):
-        if cnt == 0:
-            amps, durs = inamps[:], indurs[:]
-        else:
-            amps += [0]
-            durs += [ibi_in_ms]
-            amps += inamps
-            durs += indurs
-    return amps, durs
+    return entrain_segments(pulsefile, ibi_in_ms, count).compile()
+
+
+def entrain_segments(pulsefile: PulseFile, ibi_in_ms: float, count: int) -> Segments:
+    """repeat a pulsefile separated by ibi_in_ms without compiling it
+
+    args
+    ----
+
+    pulsefile: PulseFile
+        defines a burst
+    ibi_in_ms: float
+        how long to wait between bursts
+    count: int
+        how many bursts you want to apply
+
+
+    returns
+    ------
+    segments: Segments
+        a lazy view yielding the same amplitudes and durations as :func:`~.entrain`
+    """
+    return Segments(pulsefile.segments(), count=count, gap_in_ms=ibi_in_ms)
@@ -0,0 +1,59 @@
+from stg.api import AsyncSTG4000
+from stg._wrapper.mock import CStg200xMockNet
+import asyncio
+import time
+
+
+def test_async_order(monkeypatch, capsys):
+    calls = []
+
+    def send_start(self, bmap):
+        time.sleep(0.05)
+        calls.append(("start", bmap))
+
+    def send_stop(self, bmap):
+        calls.append(("stop", bmap))
+
+    monkeypatch.setattr(CStg200xMockNet, "SendStart", send_start)
+    monkeypatch.setattr(CStg200xMockNet, "SendStop", send_stop)
+
+    async def main():
+        async with await AsyncSTG4000.open() as stg:
+            ticks = 0
+
+            async def tick():
+                nonlocal ticks
+                while True:
+                    ticks += 1
+                    await asyncio.sleep(0.005)
+
+            ticker = asyncio.create_task(tick())
+            first = asyncio.create_task(stg.start_stimulation([0]))
+            second = asyncio.create_task(stg.stop_stimulation([1]))
+            cancelled = asyncio.create_task(stg.start_stimulation([1]))
+            await asyncio.sleep(0.01)  # the first command is running now
+            cancelled.cancel()
+            await asyncio.gather(first, second)
+            ticker.cancel()
+            assert ticks > 5  # the event loop was not blocked
+            assert cancelled.cancelled()
+
+    asyncio.run(main())
+    assert calls == [("start", 1), ("stop", 2)]
+
+
+def test_async_streaming(capsys):
+    async def main():
+        async with await AsyncSTG4000.open() as stg:
+            await stg.set_signal(0, [1, -1, 0], [0.1, 0.1, 49.8])
+            assert stg.stg._session is not None
+            waiting = asyncio.create_task(stg.wait_started())
+            await stg.start_streaming(capacity_in_s=0.1)
+            assert stg.stg._session is None  # the streamer connects on its own
+            await asyncio.wait_for(waiting, 1)
+            level = await asyncio.wait_for(stg.wait_buffer_level(0, above=0), 1)
+            assert level > 0
+            await stg.stop_streaming()
+            await asyncio.wait_for(stg.wait_stopped(), 1)
+
+    asyncio.run(main())
@@ -1,4 +1,5 @@
 from stg.api import PulseFile, STG4000
+import numpy as np
 import pytest
 from stg._wrapper.dll import available, select
 import time
@@ -60,3 +61,235 @@ def test_start_stop_all(stg):
     stg.start_stimulation()
     stg.stop_stimulation()
 
+
+
+def test_download_native(stg, monkeypatch):
+    from stg._wrapper.mock import CStg200xMockNet
+    import numpy as np
+
+    sent = []
+    monkeypatch.setattr(
+        CStg200xMockNet, "PrepareAndSendData", lambda self, *args: sent.append(args)
+    )
+    amps = np.array([1000_000, -1000_000, 0], dtype=np.int32)
+    durs = np.array([100, 100, 49800], dtype=np.uint64)
+    stg.download_native(1, amps, durs)
+    channel, amplitudes, durations, mode = sent[-1]
+    assert channel == 1
+    assert list(amplitudes) == amps.tolist()
+    assert list(durations) == durs.tolist()
+
+    stg.download(1, [1, -1, 0], [0.1, 0.1, 49.8])
+    assert list(sent[-1][1]) == amps.tolist()
+
+    with pytest.raises(ValueError):
+        stg.download_native(0, amps, durs[:1])
+
+    stg.download_native(1, [999_999.6, 0.4], [99.5, 49900.4])  # rounded, not truncated
+    assert list(sent[-1][1]) == [1000_000, 0]
+    assert list(sent[-1][2]) == [100, 49900]
+    with pytest.raises(ValueError):
+        stg.download_native(0, [0], [-1])
+
+
+def test_download_canonical(stg, monkeypatch):
+    from stg._wrapper.mock import CStg200xMockNet
+
+    sent = []
+    monkeypatch.setattr(
+        CStg200xMockNet, "PrepareAndSendData", lambda self, *args: sent.append(args)
+    )
+    stg.download(0, [1, -1, 0, 0, 1], [0.1, 0.1, 49.8, 1, 0])
+    assert list(sent[-1][1]) == [1000_000, -1000_000, 0]
+    assert list(sent[-1][2]) == [100, 100, 50800]
+    stg.download(0, [1, -1, 0, 0, 1], [0.1, 0.1, 49.8, 1, 0], canonical=False)
+    assert len(sent[-1][1]) == 5
+    stg.download(0)
+    assert list(sent[-1][1]) == [0] and list(sent[-1][2]) == [0]
+
+
+def test_quantize(stg):
+    q = stg.quantize([1, -1, 0], [0.1, 0.1, 49.8])
+    assert q.amplitudes.dtype == np.int32 and q.durations.dtype == np.uint64
+    assert q.amplitudes.tolist() == [1000_000, -1000_000, 0]
+    assert q.durations.tolist() == [100, 100, 49800]
+    assert q.amplitude_error == pytest.approx(0) and q.time_error == pytest.approx(0)
+    assert q.charge_balanced and q.out_of_range.size == 0
+
+    # the mock has a resolution of 2µA and 20µs
+    q = stg.quantize([1.0011, 0], [0.101, 0.05])
+    assert q.amplitudes.tolist() == [1002_000, 0]
+    assert q.durations.tolist() == [100, 60]
+    assert q.amplitude_error == pytest.approx(0.0009)
+    assert q.time_error == pytest.approx(0.009)  # 151µs rounded to 160µs
+    assert not q.charge_balanced
+    assert q.charge == pytest.approx(0.1002)
+
+    q = stg.quantize([17, -16, 0, -20], [1, 1, 1, 1])
+    assert q.out_of_range.tolist() == [0, 3]
+    with pytest.raises(ValueError):
+        q.raise_for_range()
+    with pytest.raises(ValueError):
+        stg.download(0, [17, 0], [1, 1])
+    with pytest.raises(ValueError):
+        stg.download_native(0, [17_000_000], [1])
+    with pytest.raises(ValueError):
+        stg.quantize([1], [-1])
+    assert stg.quantize([9000, 0], [1, 1], mode="voltage").out_of_range.tolist() == [0]
+
+    # shorter than half of the 20µs resolution
+    q = stg.quantize([1, 0, 0], [0.01, 0.005, 1])
+    assert q.vanished.tolist() == [0]  # segment 1 has no amplitude
+    with pytest.raises(ValueError):
+        q.raise_for_vanished()
+    with pytest.raises(ValueError):
+        stg.download(0, [1, 0], [0.01, 1])
+    with pytest.raises(ValueError):
+        with stg.batch() as batch:
+            batch.download(0, [1, 0], [0.01, 1])
+
+
+def test_batch(stg, monkeypatch, capsys):
+    from stg._wrapper.mock import CStg200xMockNet
+
+    calls = []
+    for name in ["PrepareAndSendData", "SetCurrentMode", "SetVoltageMode", "SetupTrigger"]:
+        monkeypatch.setattr(
+            CStg200xMockNet,
+            name,
+            lambda self, *args, name=name: calls.append((name, args)),
+        )
+    stg.invalidate()
+    capsys.readouterr()
+    for repetition in range(2):
+        with stg.batch() as batch:
+            for chan in range(stg.channel_count):
+                batch.download(chan, [1, -1, 0], [0.1, 0.1, 49.8])
+            batch.diagonalize_triggermap()
+            assert calls == []  # nothing is sent within the block
+        assert capsys.readouterr().out.count("MOCK:CONNECT") == 1
+        names = [name for name, _ in calls]
+        assert names == ["SetCurrentMode", "PrepareAndSendData", "PrepareAndSendData", "SetupTrigger"]
+        assert calls[0][1] == ()  # all channels at once
+        calls.clear()
+        if repetition == 0:  # the second time, everything is sent as well
+            stg.invalidate()
+    with stg.batch() as batch:
+        for chan in range(stg.channel_count):
+            batch.download(chan, [1, -1, 0], [0.1, 0.1, 49.8])
+        batch.diagonalize_triggermap()
+    assert calls == []  # already on the STG
+
+    with stg.batch() as batch:
+        batch.download(1, [1, 0], [0.1, 1], mode="voltage")
+        batch.set_mode([0], "current")
+    assert [name for name, _ in calls] == ["SetVoltageMode", "PrepareAndSendData"]
+    assert calls[0][1] == (1,)
+
+    calls.clear()
+    with pytest.raises(ValueError):
+        with stg.batch() as batch:
+            batch.download(0, [1], [1])
+            batch.download(1, [100], [1])  # out of range
+    with pytest.raises(RuntimeError):
+        with stg.batch() as batch:
+            batch.download(0, [1], [1])
+            raise RuntimeError()
+    with pytest.raises(ValueError):
+        with stg.batch() as batch:
+            batch.set_mode([0], "unknown")
+    assert calls == []
+
+
+def test_shadow(stg, monkeypatch):
+    from stg._wrapper.mock import CStg200xMockNet
+
+    calls = []
+    for name in ["PrepareAndSendData", "SetCurrentMode", "SetVoltageMode", "SetupTrigger"]:
+        monkeypatch.setattr(
+            CStg200xMockNet,
+            name,
+            lambda self, *args, name=name: calls.append(name),
+        )
+    stg.invalidate()
+    stg.download(0, [1, -1, 0], [0.1, 0.1, 49.8])
+    assert calls == ["SetCurrentMode", "PrepareAndSendData"]
+    stg.download(0, [1, -1, 0], [0.1, 0.1, 49.8])
+    stg.set_mode([0], "current")
+    stg.diagonalize_triggermap()
+    assert calls == ["SetCurrentMode", "PrepareAndSendData", "SetupTrigger"]
+
+    calls.clear()
+    stg.download(0, [1, -1, 0], [0.2, 0.2, 49.6])  # a different signal
+    assert calls == ["PrepareAndSendData"]
+    stg.set_mode([0], "voltage")
+    stg.set_mode([0], "current")
+    stg.download(0, [1, -1, 0], [0.2, 0.2, 49.6])  # lost by the change of mode
+    assert calls[1:] == ["SetVoltageMode", "SetCurrentMode", "PrepareAndSendData"]
+
+    calls.clear()
+    stg.invalidate([0])
+    stg.download(0, [1, -1, 0], [0.2, 0.2, 49.6])
+    assert calls == ["SetCurrentMode", "PrepareAndSendData"]
+
+    def fail(self, *args):
+        raise ConnectionError()
+
+    monkeypatch.setattr(CStg200xMockNet, "PrepareAndSendData", fail)
+    with pytest.raises(ConnectionError):
+        stg.download(0, [1, 0], [0.1, 1])
+    monkeypatch.setattr(
+        CStg200xMockNet, "PrepareAndSendData", lambda self, *args: calls.append("sent")
+    )
+    stg.download(0, [1, -1, 0], [0.2, 0.2, 49.6])  # unknown after the failure
+    assert calls[-1] == "sent"
+
+
+def test_setup_trigger(stg, monkeypatch):
+    from stg._wrapper.mock import CStg200xMockNet
+
+    calls = []
+    monkeypatch.setattr(
+        CStg200xMockNet, "SetupTrigger", lambda self, *args: calls.append(args)
+    )
+    stg.invalidate()
+    stg.diagonalize_triggermap()
+    assert calls[-1] == (0, [1, 2], [1, 2], [1, 1])
+    stg.setup_trigger(0, channel_index=[0, 1], syncout_index=[], repeat=5)
+    assert calls[-1] == (0, [3, 2], [0, 2], [5, 1])
+    assert stg.triggermap.repeat == (5, 1)
+    stg.set_repeat(0, 5)  # unchanged, nothing is sent
+    stg.setup_trigger(1)
+    assert len(calls) == 2
+    stg.set_repeat(1, 0)
+    assert calls[-1] == (0, [3, 2], [0, 2], [5, 0])
+
+    with pytest.raises(ValueError):
+        stg.setup_trigger(2)
+    with pytest.raises(ValueError):
+        stg.setup_trigger(0, channel_index=[2])
+    with pytest.raises(ValueError):
+        stg.set_repeat(0, -1)
+    with pytest.raises(ValueError):
+        stg.setup_trigger(0, syncout_index=[2])
+
+    calls.clear()
+    with stg.batch() as batch:
+        batch.set_repeat(0, 10)
+        batch.setup_trigger(1, channel_index=[0])
+    assert calls == [(0, [3, 1], [0, 2], [10, 0])]
+    stg.diagonalize_triggermap()
+    assert calls[-1] == (0, [1, 2], [1, 2], [1, 1])
+
+    # the map has one entry per trigger, even with more triggers than channels
+    monkeypatch.setattr(stg, "_trgincnt", 4)
+    stg.diagonalize_triggermap()
+    assert calls[-1] == (0, [1, 2, 0, 0], [1, 2, 4, 8], [1, 1, 1, 1])
+    stg.setup_trigger(3, channel_index=[1], syncout_index=[3])
+    assert calls[-1] == (0, [1, 2, 0, 2], [1, 2, 4, 8], [1, 1, 1, 1])
+    with pytest.raises(ValueError):
+        stg.setup_trigger(4)
+    with pytest.raises(ValueError):
+        stg.setup_trigger(3, channel_index=[2])
+    monkeypatch.undo()
+    stg.diagonalize_triggermap()
@@ -0,0 +1,34 @@
+from stg.api import DeviceGroup
+from stg._wrapper.mock import CStg200xMockNet
+import pytest
+import time
+
+
+def test_group_parallel(monkeypatch, capsys):
+    def slow_start(self, bmap):
+        time.sleep(0.1)
+
+    monkeypatch.setattr(CStg200xMockNet, "SendStart", slow_start)
+    with DeviceGroup([-1] * 4) as group:
+        assert len(group) == 4
+        t0 = time.perf_counter()
+        results = group.start_stimulation([0])
+        assert time.perf_counter() - t0 < 0.3
+    assert [result.serial for result in results] == [-1] * 4
+    assert all(result.ok for result in results)
+    assert all(result.duration_in_s >= 0.1 for result in results)
+
+
+def test_group_errors(capsys):
+    with DeviceGroup([-1, -1]) as group:
+        results = group.download(0, [1, -1, 0], [0.1, 0.1, 49.8])
+        assert all(result.ok for result in results)
+        results = group.download(0, [100, -100], [0.1, 0.1])
+        assert not any(result.ok for result in results)
+        assert all(isinstance(result.error, ValueError) for result in results)
+        assert all(result.value is None for result in results)
+
+
+def test_group_empty():
+    with pytest.raises(ValueError):
+        DeviceGroup([])
@@ -0,0 +1,67 @@
+from stg._wrapper.latency import LatencyRecorder
+from stg._wrapper.dll import (
+    MockingInterface,
+    start_instrumentation,
+    stop_instrumentation,
+)
+import json
+import pytest
+
+
+def test_recorder(tmp_path):
+    recorder = LatencyRecorder()
+    for ms in range(1, 101):
+        recorder.record("GetDataQueueSpace", ms / 1000)
+    summary = recorder.summary()["GetDataQueueSpace"]
+    assert summary["count"] == 100
+    assert summary["max_ms"] == pytest.approx(100)
+    assert summary["mean_ms"] == pytest.approx(50.5)
+    assert 50 <= summary["p50_ms"] <= 50 * 1.1  # histogram error < 9%
+    assert 99 <= summary["p99_ms"] <= 100
+
+    fname = tmp_path / "latency.json"
+    recorder.dump(fname)
+    assert json.loads(fname.read_text()) == recorder.summary()
+    recorder.reset()
+    assert recorder.summary() == {}
+
+
+def test_instrumentation(capsys):
+    recorder = start_instrumentation()
+    try:
+        with MockingInterface("test") as interface:
+            for _ in range(3):
+                interface.GetDataQueueSpace(0)
+            interface.EnqueueData(0, [1, 2, 3])
+    finally:
+        assert stop_instrumentation() is recorder
+    summary = recorder.summary()
+    assert summary["GetDataQueueSpace"]["count"] == 3
+    assert summary["EnqueueData"]["count"] == 1
+    assert summary["Connect"]["count"] == 1
+    assert summary["Disconnect"]["count"] == 1
+
+    with MockingInterface("test") as interface:
+        interface.GetDataQueueSpace(0)
+    assert recorder.summary()["GetDataQueueSpace"]["count"] == 3
+
+
+def test_bound_methods(capsys):
+    interface = MockingInterface("test")
+    assert "GetDataQueueSpace" not in vars(interface)
+    with interface:
+        assert "GetDataQueueSpace" in vars(interface)
+        hot = interface.GetDataQueueSpace
+        assert hot.__wrapped__.__self__ is interface._interface
+        # instrumentation applies to connections which are already open
+        recorder = start_instrumentation()
+        try:
+            interface.GetDataQueueSpace(0)
+            interface.EnqueueData(0, [1, 2, 3])
+        finally:
+            stop_instrumentation()
+        interface.GetDataQueueSpace(0)  # not recorded anymore
+        assert interface.GetDataQueueSpace is hot
+    summary = recorder.summary()
+    assert summary["GetDataQueueSpace"]["count"] == 1
+    assert summary["EnqueueData"]["count"] == 1
@@ -1,5 +1,5 @@
 from stg._wrapper.mock import CStg200xMockNet, _mock, DeviceInfo
-from stg._wrapper.dll import BasicInterface, MockingInterface
+from stg._wrapper.dll import BasicInterface, MockingInterface, Session
 import pytest
 from stg._wrapper.streamingnet import STG4000Streamer
 
@@ -65,3 +65,193 @@ def test_properties(stg, field, value):
 def test_set_mode(stg):
     stg.set_mode(mode="current")
     stg.set_mode(mode="voltage")
+
+
+def test_session(stg, capsys):
+    capsys.readouterr()
+    stg.open_session()
+    stg.start_stimulation([0])
+    stg.download(0, [1, -1, 0], [0.1, 0.1, 49.8])
+    stg.stop_stimulation()
+    stg.close_session()
+    pipe = capsys.readouterr()
+    assert pipe.out.count("MOCK:CONNECT") == 1
+    assert pipe.out.count("MOCK:DISCONNECT") == 1
+
+    with stg.session():
+        stg.start_stimulation([0])
+        stg.stop_stimulation([0])
+    assert stg._session is None
+    pipe = capsys.readouterr()
+    assert pipe.out.count("MOCK:CONNECT") == 1
+
+    stg.start_stimulation([0])  # without a session, every call connects
+    stg.stop_stimulation([0])
+    assert capsys.readouterr().out.count("MOCK:CONNECT") == 2
+
+
+def test_session_reconnects_after_error():
+    session = Session(MockingInterface("test"))
+    with pytest.raises(RuntimeError):
+        with session as interface:
+            assert session.connected
+            raise RuntimeError("USB cable pulled")
+    assert not session.connected
+    with session as interface:
+        assert session.connected
+    assert session.connected
+    session.close()
+    assert not session.connected
+
+
+def test_session_reconnects_after_failed_connect(monkeypatch, capsys):
+    from stg._wrapper.mock import CStg200xMockNet
+
+    attempts = []
+
+    def connect(self, info):
+        attempts.append(info)
+        if len(attempts) == 1:
+            raise ConnectionError("USB cable pulled")
+        return 0
+
+    monkeypatch.setattr(CStg200xMockNet, "Connect", connect)
+    session = Session(MockingInterface("test"))
+    with pytest.raises(ConnectionError):
+        session.open()
+    assert not session.connected
+    with session:
+        assert session.connected
+    assert len(attempts) == 2
+    session.close()
+
+
+def test_property_cache(monkeypatch, tmp_path, capsys):
+    import json
+    from stg._wrapper.mock import CStg200xMockNet
+
+    calls = []
+    original = CStg200xMockNet.GetCurrentRangeInNanoAmp
+    monkeypatch.setattr(
+        CStg200xMockNet,
+        "GetCurrentRangeInNanoAmp",
+        lambda self, ptr: calls.append(ptr) or original(self, ptr),
+    )
+    monkeypatch.setattr(
+        STG4000Streamer, "interface", lambda self: MockingInterface(DeviceInfo)
+    )
+    cache = tmp_path / "properties.json"
+    stg = STG4000Streamer(property_cache=cache)
+    assert len(calls) == 1  # every property is collected only once
+    assert cache.exists()
+    cached = STG4000Streamer(property_cache=cache)
+    assert len(calls) == 1  # the second instance read the cache
+    for field, value in field_values:
+        assert getattr(cached, field) == value
+
+    # an updated firmware invalidates the cache
+    monkeypatch.setattr(
+        CStg200xMockNet, "GetStgVersionInfo", lambda self, a, b: ("", "M-Soft2", "M-Hard")
+    )
+    STG4000Streamer(property_cache=cache)
+    assert len(calls) == 2
+
+    cache.write_text("corrupted")
+    STG4000Streamer(property_cache=cache)
+    assert len(calls) == 3
+
+    # malformed content is a cache miss, and is overwritten
+    (serial, entry), = json.loads(cache.read_text()).items()
+    incomplete = {"version": entry["version"], "properties": dict(entry["properties"])}
+    del incomplete["properties"]["trigger_inputs"]
+    malformed = [
+        [],
+        {serial: []},
+        {serial: {"version": entry["version"], "properties": []}},
+        {serial: incomplete},
+    ]
+    for content in malformed:
+        cache.write_text(json.dumps(content))
+        STG4000Streamer(property_cache=cache)
+    assert len(calls) == 3 + len(malformed)
+    assert json.loads(cache.read_text()) == {serial: entry}
+
+    # an unwritable cache falls back to the properties read from the STG
+    blocked = tmp_path / "file"
+    blocked.write_text("")
+    fallback = STG4000Streamer(property_cache=blocked / "properties.json")
+    assert len(calls) == 4 + len(malformed)
+    for field, value in field_values:
+        if field != "version":  # patched above
+            assert getattr(fallback, field) == value
+
+
+def test_property_cache_concurrent_writes(tmp_path):
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+    from stg._wrapper.dll import _write_property_cache
+
+    cache = tmp_path / "properties.json"
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [
+            pool.submit(_write_property_cache, cache, serial, ("a", "b"), {"x": 1})
+            for serial in range(32)
+        ]
+    for future in futures:
+        future.result()
+    assert json.loads(cache.read_text())
+    assert [p.name for p in tmp_path.iterdir()] == ["properties.json"]
+
+
+def test_device_cache():
+    from stg._wrapper import dll
+    from stg._wrapper.mock import CMcsUsbListNet, DeviceList
+
+    dll._device_cache.clear()
+    scans = CMcsUsbListNet.call_count
+    devices = dll.available()
+    assert len(devices) == 1
+    assert dll.available() == devices
+    assert dll.select(70007) is devices[0]
+    assert dll.select() is devices[0]  # the first available STG
+    assert CMcsUsbListNet.call_count == scans + 1  # enumerated only once
+    dll.available(refresh=True)
+    assert CMcsUsbListNet.call_count == scans + 2
+    dll.select(70007, refresh=True)
+    assert CMcsUsbListNet.call_count == scans + 3
+
+    entries = DeviceList.GetUsbListEntry.call_count
+    with pytest.raises(ConnectionError):
+        dll.select(12345)  # unknown serial numbers trigger a new enumeration
+    assert CMcsUsbListNet.call_count == scans + 4
+    assert DeviceList.GetUsbListEntry.call_count == entries + 1
+    dll._device_cache.ttl_in_s = 0
+    try:
+        dll.available()
+        assert CMcsUsbListNet.call_count == scans + 5
+    finally:
+        del dll._device_cache.ttl_in_s  # back to the class default
+
+
+def test_lazy_backend():
+    "importing the api must neither load the DLL nor the mock"
+    import subprocess
+    import sys
+
+    code = (
+        "import sys, time\n"
+        "t0 = time.perf_counter()\n"
+        "import stg.api\n"
+        "print(time.perf_counter() - t0)\n"
+        "print(*[m for m in ('clr', 'unittest.mock', 'stg._wrapper.mock') if m in sys.modules])\n"
+        "stg.api.STG4000.output_rate_in_hz\n"
+        "from stg._wrapper.dll import available\n"
+        "available()\n"
+        "print('stg._wrapper.mock' in sys.modules)\n"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.splitlines()
+    print(f"import stg.api took {float(out[0])*1000:.1f}ms")
+    assert out[1] == ""  # no backend loaded during import
+    assert out[2] == "True"  # but on first device use
@@ -1,4 +1,19 @@
-from stg.pulsefile import entrain, PulseFile, dump, decompress
+import warnings
+from stg.pulsefile import (
+    entrain,
+    entrain_segments,
+    Segments,
+    PulseFile,
+    dump,
+    load,
+    dump_protocol,
+    load_protocol,
+    canonicalize,
+    decompress,
+    decompress_array,
+    CompressedSignal,
+)
+import numpy as np
 import pytest
 from pathlib import Path
 
@@ -29,6 +44,56 @@ def test_decompress():
         signal = decompress(amplitudes_in_mA=[1, 1], durations_in_ms=[0.1])
 
 
+def test_decompress_array():
+    amplitudes_in_mA = [1, -1, 0]
+    durations_in_ms = [0.1, 0.1, 49.8]
+    signal = decompress_array(amplitudes_in_mA, durations_in_ms)
+    assert signal.dtype == np.float32
+    assert signal.tolist() == decompress(amplitudes_in_mA, durations_in_ms)
+
+    signal = decompress_array(
+        amplitudes_in_mA, durations_in_ms, dtype=np.int16, scale=2_000
+    )
+    assert signal.dtype == np.int16
+    assert signal[0:5].tolist() == [2000] * 5
+    assert signal[5:10].tolist() == [-2000] * 5
+
+    with pytest.raises(ValueError):
+        decompress_array([100], [1], dtype=np.int16, scale=2_000)
+
+
+def test_compressed_signal():
+    amplitudes_in_mA = [1, -1, 0, 0]
+    durations_in_ms = [0.1, 0.1, 0, 49.8]
+    sig = CompressedSignal.from_durations(amplitudes_in_mA, durations_in_ms)
+    exp = decompress(amplitudes_in_mA, durations_in_ms)
+    assert len(sig.counts) == 3  # the empty segment was dropped
+    assert len(sig) == 2500
+    assert sig == exp
+    assert list(sig) == exp
+    assert sig[4] == 1 and sig[5] == -1 and sig[-1] == 0
+    assert sig[3:7] == exp[3:7]
+    assert list(sig.segments()) == [(1, 5), (-1, 5), (0, 2490)]
+    assert CompressedSignal.from_samples(exp) == sig
+
+    buffer = np.zeros(100)
+    chunk = sig.expand(3, 8, out=buffer)
+    assert chunk.base is buffer
+    assert chunk.tolist() == exp[3:8]
+    assert sig.expand(2400).tolist() == exp[2400:]
+    wave = np.sin(np.arange(1000))  # many short segments
+    assert CompressedSignal.from_samples(wave).expand(10, 500).tolist() == wave[10:500].tolist()
+
+    with pytest.raises(ValueError):
+        sig.expand(0, 200, out=buffer)
+    with pytest.raises(IndexError):
+        sig[2500]
+    with pytest.raises(ValueError):
+        CompressedSignal([1, 2], [1])
+    with pytest.raises(ValueError):
+        sig.astype(np.int16, scale=100_000)
+
+
 def test_pw_raises():
     with pytest.raises(ValueError):
         pf = PulseFile(pulsewidth_in_ms=-1)
@@ -166,3 +231,167 @@ def test_entrain():
     assert amps[0:3] == amps[4:]
     assert durs[0:3] == d
     assert amps[0:3] == a
+
+
+def test_entrain_segments():
+    pf = PulseFile(burstcount=3)
+    segments = entrain_segments(pf, ibi_in_ms=1, count=4)
+    amps, durs = entrain(pf, ibi_in_ms=1, count=4)
+    assert len(segments) == len(amps) == 4 * 9 + 3
+    assert segments.duration_in_ms == pytest.approx(sum(durs))
+    assert list(segments) == list(zip(amps, durs))
+    assert [segments[i] for i in range(-len(amps), len(amps))] == list(zip(amps, durs)) * 2
+    assert list(segments.amplitudes_in_mA) == amps
+    assert np.asarray(segments.durations_in_ms).tolist() == durs
+    assert pf.segments().compile() == pf.compile()
+    with pytest.raises(IndexError):
+        segments[len(amps)]
+
+    huge = entrain_segments(pf, ibi_in_ms=1, count=10 ** 9)
+    assert len(huge) == 10 ** 9 * 10 - 1
+    assert huge[-1] == (0, 49.8)
+    assert entrain(pf, 1, 0) == ([], [])
+
+
+def test_segments_raises():
+    with pytest.raises(ValueError):
+        Segments([(1, 1)], count=-1)
+    with pytest.raises(ValueError):
+        Segments([(1, 1)], gap_in_ms=-1)
+
+
+def test_pulsefile_is_a_cached_value():
+    import pickle
+
+    PulseFile.cache_clear()
+    pf = PulseFile(intensity_in_mA=2, burstcount=5)
+    assert pf == PulseFile(intensity_in_mA=2, burstcount=5)
+    assert pf != PulseFile(intensity_in_mA=3, burstcount=5)
+    assert hash(pf) == hash(PulseFile(intensity_in_mA=2, burstcount=5))
+    assert pickle.loads(pickle.dumps(pf)) == pf
+    with pytest.raises(AttributeError):
+        pf.isi = 1
+    with pytest.raises(AttributeError):
+        pf.other = 1
+
+    amps, durs = pf.compile()
+    amps.append(99)  # callers get their own copy
+    assert PulseFile(intensity_in_mA=2, burstcount=5).compile() == pf.compile()
+    info = PulseFile.cache_info()["compile"]
+    assert info.misses == 1 and info.hits == 2
+
+    signal = pf.decompress()
+    assert signal is pf.decompress()
+    assert signal.tolist() == decompress(*pf.compile())
+    assert PulseFile.cache_info()["decompress"].hits == 1
+
+
+def test_dump_in_chunks(tmp_path):
+    from stg.pulsefile import DATFILE_HEADER, encode
+
+    pfs = [PulseFile(burstcount=50), PulseFile(mode="monophasic", burstcount=7)]
+    fname = tmp_path / "chunked.dat"
+    dump(pfs, fname, buffer_size=64)  # forces several chunks per channel
+    with open(fname) as f:
+        content = f.readlines()
+    exp = DATFILE_HEADER + encode(pfs[0], 0) + ["\n"] + encode(pfs[1], 1)
+    assert content == exp
+
+
+def test_load(tmp_path):
+    pfs = [PulseFile(burstcount=50), PulseFile(intensity_in_mA=2, mode="monophasic")]
+    fname = tmp_path / "roundtrip.dat"
+    dump(pfs, fname)
+    channels = load(fname, chunk_lines=7)
+    assert sorted(channels) == [0, 1]
+    for idx, pf in enumerate(pfs):
+        amps, durs = channels[idx]
+        exp_amps, exp_durs = pf.compile()
+        assert amps.tolist() == exp_amps
+        assert durs == pytest.approx(exp_durs)
+
+    with pytest.raises(ValueError):
+        load(tmp_path / "wrong.suffix")
+    fname.write_text("Something else\n")
+    with pytest.raises(ValueError):
+        load(fname)
+    fname.write_text("Multi Channel Systems MC_Stimulus II\n1\t100\n")
+    with pytest.raises(ValueError):
+        load(fname)
+    fname.write_text("Multi Channel Systems MC_Stimulus II\nchannel: 1\n1\t100\t3\n")
+    with pytest.raises(ValueError):
+        load(fname)
+    header = "Multi Channel Systems MC_Stimulus II\nformat: 4\n\nchannel: 1\n\nvalue\ttime\n"
+    fname.write_text(header + "1\t100\n 2\t100\n\n")
+    assert load(fname)[0][0].tolist() == [1, 2]  # leading whitespace is fine
+    fname.write_text(header + "1\t100\nabc\n2\t100\n")
+    with pytest.raises(ValueError):
+        load(fname)
+    # rows with too many and too few cells must not be paired up again
+    fname.write_text(header + "1\t100\n1 2 3\n4\n")
+    with pytest.raises(ValueError):
+        load(fname)
+    fname.write_text(header + "1\t100\n2\tabc\n")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        with pytest.raises(ValueError):
+            load(fname)
+
+
+def test_protocol_roundtrip(tmp_path):
+    pf = PulseFile(burstcount=3)
+    channels = {1: pf.compile(), 0: ([1.5], [0.02]), 3: ([], [])}
+    fname = tmp_path / "protocol.stg"
+    with pytest.raises(ValueError):
+        dump_protocol({0: ([3000], [1])}, fname)  # would wrap around in int32
+    with pytest.raises(ValueError):
+        dump_protocol({0: ([1], [-1])}, fname)
+    dump_protocol(channels, fname, mode="voltage", rate_in_hz=10_000)
+    protocol = load_protocol(fname)
+    assert protocol.mode == "voltage"
+    assert protocol.rate_in_hz == 10_000
+    assert sorted(protocol.channels) == [0, 1, 3]
+    amps, durs = protocol.channels[1]
+    assert isinstance(amps, np.memmap)
+    assert amps.dtype == np.int32 and durs.dtype == np.uint64
+    assert amps.tolist() == [1000_000, -1000_000, 0] * 3
+    assert durs.tolist() == [100, 100, 49800] * 3
+    assert protocol.channels[0][0].tolist() == [1500_000]
+    assert protocol.channels[0][1].tolist() == [20]
+    assert len(protocol.channels[3][0]) == 0
+    with pytest.raises(ValueError):
+        amps[0] = 1  # read-only
+
+    with pytest.raises(ValueError):
+        dump_protocol(channels, tmp_path / "protocol.dat")
+    with pytest.raises(ValueError):
+        dump_protocol(channels, fname, mode="unknown")
+    with pytest.raises(ValueError):
+        dump_protocol({0: ([1], [])}, fname)
+    (tmp_path / "other.stg").write_bytes(b"not a protocol")
+    with pytest.raises(ValueError):
+        load_protocol(tmp_path / "other.stg")
+
+
+def test_canonicalize():
+    amps, durs = entrain(PulseFile(), ibi_in_ms=1, count=2)
+    a, d = canonicalize(amps, durs)
+    assert a.tolist() == [1, -1, 0, 1, -1, 0]
+    assert d.tolist() == pytest.approx([0.1, 0.1, 50.8, 0.1, 0.1, 49.8])
+
+    # in the units of the STG, i.e. nA and µs
+    a, d = canonicalize(
+        [1000, 3000, 2999, 0, 0, 7],
+        [100, 0, 101, 13, 4, 10],
+        amplitude_resolution=2000,
+        time_resolution=20,
+    )
+    assert a.dtype == int and d.dtype == int
+    assert a.tolist() == [0, 2000, 0]
+    assert d.tolist() == [100, 100, 20]
+    assert sum(d) == 220  # the end at 228µs is rounded, errors do not accumulate
+
+    a, d = canonicalize([1, 2], [0, 0])
+    assert len(a) == len(d) == 0
+    with pytest.raises(ValueError):
+        canonicalize([1], [])
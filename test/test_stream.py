@@ -1,4 +1,5 @@
 from stg._wrapper.streamingnet import STG4000Streamer, SignalMapping
+from stg.pulsefile import CompressedSignal
 import pytest
 import threading
 import time
@@ -12,6 +13,12 @@ def test_signal_mapping():
         s[8] = []
     s[0] = [1, -1, 0]
     assert s[0] == [2000, -2000, 0]  # due to the scalar
+    assert list(s.prepared(0).array) == [2000, -2000, 0]
+    s[0] = [0.5]
+    assert s[0] == [1000]  # fractional mA are not truncated
+    s[1] = CompressedSignal.from_durations([1, 0], [0.1, 1000])
+    assert len(s[1].counts) == 2  # 50k samples are stored as two segments
+    assert s[1][0] == 2000
 
 
 @pytest.fixture(scope="module")
@@ -55,3 +62,198 @@ def test_increase_pulse_width():
 
     stg.stop_streaming()
 
+
+
+class FakeDevice:
+    "records the calls of the streaming thread and drains a buffer of fixed size"
+
+    def __init__(self, space: int):
+        self.space = space
+        self.queries = 0
+        self.enqueued = {}
+
+    def GetDataQueueSpace(self, chan):
+        self.queries += 1
+        return self.space
+
+    def EnqueueData(self, chan, data):
+        self.enqueued.setdefault(chan, []).extend(data)
+        self.space -= len(data)
+
+
+def test_ring_cursor():
+    from stg._wrapper.streamingnet import RingCursor
+
+    s = SignalMapping()
+    s[0] = [1, 2, 3, 4, 5]
+    cursor = RingCursor(0)
+    device = FakeDevice(3)
+    assert cursor.fill(device, 3, s) == 3
+    assert cursor.position == 3
+    s[0] = [-1, -2, -3, -4, -5]  # picked up with the next period
+    assert cursor.fill(device, 9, s) == 9
+    assert device.enqueued[0] == [
+        v * 2000 for v in [1, 2, 3, 4, 5, -1, -2, -3, -4, -5, -1, -2]
+    ]
+    assert cursor.position == 2
+
+    s.max_prepared = 10
+    s[1] = CompressedSignal.from_samples([0.5] * 50)  # longer than the buffer
+    cursor = RingCursor(1)
+    device = FakeDevice(0)
+    for _ in range(7):
+        cursor.fill(device, 8, s)
+    assert len(device.enqueued[1]) == 56 and cursor.position == 6
+    assert set(device.enqueued[1]) == {1000}
+
+
+def test_streaming_sleeps(monkeypatch, capsys):
+    from stg._wrapper.mock import CStg200xMockNet
+
+    queries = []
+    original = CStg200xMockNet.GetDataQueueSpace
+    monkeypatch.setattr(
+        CStg200xMockNet,
+        "GetDataQueueSpace",
+        lambda self, chan: queries.append(chan) or original(self, chan),
+    )
+    stg = STG4000Streamer()
+    stg.set_signal(0, amplitudes_in_mA=[1, -1, 0], durations_in_ms=[0.1, 0.1, 49.8])
+    stg.start_streaming(capacity_in_s=0.1, buffer_in_s=0.1)
+    queries.clear()
+    time.sleep(0.5)
+    t0 = time.perf_counter()
+    stg.stop_streaming()
+    assert time.perf_counter() - t0 < 0.1  # woken up instead of sleeping on
+    # the buffer of 5000 samples is refilled about every 500 samples, i.e. 10ms
+    assert 10 < len(queries) < 200
+
+
+def test_service_by_deficit(capsys):
+    class Device(FakeDevice):
+        def __init__(self, spaces):
+            super().__init__(0)
+            self.spaces = spaces
+            self.order = []
+
+        def GetDataQueueSpace(self, chan):
+            return self.spaces[chan]
+
+        def EnqueueData(self, chan, data):
+            self.order.append(chan)
+            self.spaces[chan] -= len(data)
+
+    stg = STG4000Streamer()
+    for chan in range(2):
+        stg.set_signal(chan, [1, 0], [0.02, 0.02])
+    cursors = {}
+    device = Device({0: 10, 1: 40})
+    assert stg._service(device, cursors, 40) == (0, 50)
+    assert device.order[0] == 1  # the emptiest first
+    assert stg.underruns == {}  # the very first fill is no underrun
+    device.spaces.update({0: 40, 1: 20})
+    stg._service(device, cursors, 40)
+    assert stg.underruns == {0: 1}
+
+
+def test_switch_signal():
+    from stg._wrapper.streamingnet import RingCursor
+
+    s = SignalMapping()
+    s[0] = [1, 2, 3, 4, 5]
+    cursor = RingCursor(0)
+    device = FakeDevice(0)
+    cursor.fill(device, 2, s)
+    s.set(0, [-1, -2, -3], switch_at_sample=3)
+    cursor.fill(device, 4, s)  # switches after the 3rd sample of the period
+    cursor.fill(device, 2, s)
+    s.set(0, [7, 8], switch_at_sample=1)  # already past it, i.e. at the end
+    cursor.fill(device, 5, s)
+    assert [v // 2000 for v in device.enqueued[0]] == [
+        1, 2, 3, -1, -2, -3, -1, -2, -3, 7, 8, 7, 8
+    ]
+    with pytest.raises(ValueError):
+        s.set(0, [1], switch_at_sample=-1)
+
+
+def test_add_channel_while_streaming(capsys):
+    stg = STG4000Streamer()
+    stg.set_signal(0, amplitudes_in_mA=[1, -1, 0], durations_in_ms=[0.1, 0.1, 49.8])
+    stg.start_streaming(capacity_in_s=0.1)
+    try:
+        for _ in range(50):
+            for chan in range(1, 8):
+                stg.set_signal(chan, [1, 0], [0.1, 1])
+            time.sleep(0.002)
+        assert stg.started
+    finally:
+        stg.stop_streaming()
+    assert "Exception" not in capsys.readouterr().out
+
+
+def test_channels_are_prepared():
+    "every channel listed for the streaming thread already has its prepared signal"
+    mappings = [SignalMapping() for _ in range(200)]
+    errors = []
+
+    def read():
+        for s in mappings:
+            while len(s.channels()) < 8:
+                try:
+                    for chan in s.channels():
+                        s.prepared(chan)
+                except KeyError as e:  # pragma no cover
+                    errors.append(e)
+
+    reader = threading.Thread(target=read)
+    reader.start()
+    for s in mappings:
+        for chan in range(8):
+            s[chan] = [1, 0]
+    reader.join()
+    assert errors == []
+
+
+def test_streaming_invalidates_shadow(monkeypatch, capsys):
+    from stg._wrapper.mock import CStg200xMockNet
+
+    stg = STG4000Streamer()
+    stg.download(0, [1, -1, 0], [0.1, 0.1, 49.8])
+    stg.set_signal(0, amplitudes_in_mA=[1, -1, 0], durations_in_ms=[0.1, 0.1, 49.8])
+    stg.start_streaming(capacity_in_s=0.1)
+    stg.stop_streaming()
+
+    calls = []
+    for name in ["PrepareAndSendData", "SetupTrigger"]:
+        monkeypatch.setattr(
+            CStg200xMockNet, name, lambda self, *args, name=name: calls.append(name)
+        )
+    stg.diagonalize_triggermap()
+    stg.download(0, [1, -1, 0], [0.1, 0.1, 49.8])
+    assert calls == ["SetupTrigger", "PrepareAndSendData"]
+
+
+def test_ring_cursor_blocks(monkeypatch):
+    from stg._wrapper.streamingnet import RingCursor
+
+    class Device(FakeDevice):
+        def EnqueueData(self, chan, data):
+            self.arrays.add(id(data))
+            super().EnqueueData(chan, data)
+
+    s = SignalMapping()
+    s[0] = CompressedSignal.from_durations([1, -1, 0], [0.1, 0.1, 49.8])
+    expanded = []
+    monkeypatch.setattr(
+        CompressedSignal, "expand", lambda *args, **kwargs: expanded.append(args)
+    )
+    cursor = RingCursor(0, block=500)
+    device = Device(0)
+    device.arrays = set()
+    sent = sum(cursor.fill(device, 523, s) for _ in range(100))
+    assert sent == 100 * 500  # the rest waits for the next refill
+    assert expanded == []  # copied from the prepared array
+    assert len(device.arrays) == 1  # always the same staging array
+    assert device.enqueued[0][:5] == [2000] * 5
+    assert device.enqueued[0][2500:2505] == [2000] * 5  # the next period
+    assert device.enqueued[0][2495:2500] == [0] * 5